@@ -0,0 +1,78 @@
+"""
+Query plans and timings of the hot order and product queries with and without their indexes.
+
+    python -m benchmarks.indexes
+"""
+from benchmarks.utils import seed, setup_django, timed
+
+
+def explain(connection, queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def main():
+    connection = setup_django()
+    from django.db.models import Sum
+    from django.utils import timezone
+
+    from order.models import Order, OrderItem
+    from product.models import Product
+
+    users, _ = seed()
+    now = timezone.now()
+    index_names = {
+        "order_created_at_id_idx", "order_owner_status_idx", "order_pending_created_idx",
+        "orderitem_order_product_idx", "product_quantity_idx", "product_created_at_id_idx",
+        "product_needs_reorder_idx",
+    }
+    indexes = [
+        (model, index)
+        for model in (Order, OrderItem, Product)
+        for index in model._meta.indexes
+        if index.name in index_names
+    ]
+    queries = {
+        "sales report range": lambda: OrderItem.objects.filter(
+            order__created_at__range=(now - timezone.timedelta(days=30), now)
+        ).values_list("id", "total_price"),
+        "order list page": lambda: Order.objects.order_by("-created_at", "-id").values_list("id")[:10],
+        "owner + status filter": lambda: Order.objects.filter(owner=users[3], status="pending").values_list("id"),
+        "frequent purchase aggregate": lambda: OrderItem.objects.filter(order__owner=users[3])
+        .values("product")
+        .annotate(total=Sum("quantity_required"))
+        .order_by("-total"),
+        "low stock report": lambda: Product.objects.filter(quantity__lt=10).values_list("id"),
+        "needs reorder page": lambda: Product.objects.filter(needs_reorder=True)
+        .order_by("quantity", "id")
+        .values_list("id")[:100],
+    }
+
+    def measure(label):
+        print(f"\n=== {label} ===")
+        for name, build in queries.items():
+            plan = explain(connection, build())
+            elapsed = timed(lambda: list(build()))
+            print(f"{name:<30} {elapsed:8.2f} ms")
+            for line in plan:
+                print(f"    {line}")
+
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    measure("without indexes")
+
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.add_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    measure("with indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Bulk order import through the bulk-import endpoint, the 10k orders a minute target of the import.
+
+    python -m benchmarks.order_import
+"""
+import json
+
+from benchmarks.utils import seed, setup_django, timed
+
+ORDERS = 10000
+
+
+def main():
+    setup_django()
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from product.models import Product
+
+    users, products = seed(products=500, orders=0)
+    Product.objects.update(quantity=1_000_000)
+    admin = users[0]
+    admin.role = "admin"
+    admin.save()
+    client = APIClient()
+    client.force_authenticate(admin)
+    url = reverse("order:order-bulk-import-orders")
+
+    body = "\n".join(
+        json.dumps(
+            {
+                "owner": users[index % len(users)].id,
+                "items": [{"product": products[(index + offset) % len(products)].id, "quantity_required": 1} for offset in range(3)],
+            }
+        )
+        for index in range(ORDERS)
+    )
+    elapsed = timed(lambda: client.post(url, data=body, content_type="application/x-ndjson"), repeat=1)
+    print(f"{ORDERS} orders {elapsed / 1000:8.2f} s {ORDERS / elapsed * 60000:10.0f} orders/minute")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Order list pages with embedded items (?include=items) against the default item summary.
+
+    python -m benchmarks.order_listing
+"""
+from benchmarks.utils import seed, setup_django, timed
+
+PAGE_SIZE = 100
+
+
+def main():
+    setup_django()
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from user.models import User
+
+    seed(products=500, orders=20000, items_per_order=50)
+    admin = User.objects.first()
+    admin.role = "admin"
+    admin.save()
+    client = APIClient()
+    client.force_authenticate(admin)
+    url = reverse("order:order-list")
+
+    for label, params in (("?include=items", {"include": "items"}), ("summary", {})):
+        params = {**params, "page_size": PAGE_SIZE, "pagination": "cursor"}
+        content = client.get(url, params).content
+        elapsed = timed(lambda: client.get(url, params), repeat=5)
+        print(f"{label:<16} {len(content) / 1024:8.1f} KiB {elapsed:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Order search through SearchFilter joins against OrderProductSearchFilter (EXISTS on a product subquery).
+
+    python -m benchmarks.order_search
+"""
+from benchmarks.utils import seed, setup_django, timed
+
+
+class SearchView:
+    search_fields = ["orderitem__product__name", "orderitem__product__description"]
+    product_search_fields = ["name", "description"]
+
+
+def main():
+    setup_django()
+    from rest_framework import filters
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from order.filters import OrderProductSearchFilter
+    from order.models import Order
+
+    seed(orders=20000, items_per_order=20)
+    factory = APIRequestFactory()
+    view = SearchView()
+    backends = {
+        "SearchFilter (joins)": filters.SearchFilter(),
+        "OrderProductSearchFilter": OrderProductSearchFilter(),
+    }
+
+    for term in ["chair", "red chair", "product 42 "]:
+        request = Request(factory.get("/", {"search": term}))
+        print(f"\nsearch={term!r}")
+        for name, backend in backends.items():
+            queryset = backend.filter_queryset(request, Order.objects.order_by("-created_at", "-id"), view)
+            page = timed(lambda: list(queryset.values_list("id", flat=True)[:10]), repeat=3)
+            count = timed(lambda: queryset.count(), repeat=3)
+            deep_page = timed(lambda: list(queryset.values_list("id", flat=True)[5000:5010]), repeat=3)
+            print(f"  {name:<28} first page {page:8.2f} ms   page 500 {deep_page:8.2f} ms   count {count:8.2f} ms")
+        results = [
+            list(backend.filter_queryset(request, Order.objects.order_by("-created_at", "-id"), view).values_list("id", flat=True))
+            for backend in backends.values()
+        ]
+        print(f"  same orders: {results[0] == results[1]} ({len(results[1])} orders)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Catalog import through the import_products command, the nightly 50k sku sync: a first run
+creating every product, then a second one updating them all.
+
+    python -m benchmarks.product_import
+"""
+import os
+import tempfile
+from io import StringIO
+
+from benchmarks.utils import setup_django, timed
+
+ROWS = 50000
+
+
+def main():
+    setup_django()
+    from django.core.management import call_command
+
+    from user.models import User
+
+    user = User.objects.create(email="importer@example.com", firstname="import", lastname="user")
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+        handle.write("sku,name,description,quantity,price,reorder_point\n")
+        for index in range(ROWS):
+            handle.write(f"SKU-{index},product {index},description of product {index},{index % 500 + 1},{index % 100}.25,10\n")
+    try:
+        for label in ("create", "update"):
+            elapsed = timed(
+                lambda: call_command("import_products", handle.name, "--created-by", str(user.id), stdout=StringIO()),
+                repeat=1,
+            )
+            print(f"{label:<8} {ROWS} rows {elapsed / 1000:8.2f} s")
+    finally:
+        os.unlink(handle.name)
+
+
+if __name__ == "__main__":
+    main()
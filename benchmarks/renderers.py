@@ -0,0 +1,52 @@
+"""
+JSONRenderer / JSONParser against the orjson backed FastJSONRenderer / FastJSONParser,
+over the serialized data of 1000 orders and a sales report sized payload.
+
+    python -m benchmarks.renderers
+"""
+from io import BytesIO
+
+from benchmarks.utils import seed, setup_django, timed
+
+PAGE_SIZE = 1000
+
+
+def main():
+    setup_django()
+    from django.db.models import Prefetch, Sum
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from core.parsers import FastJSONParser
+    from core.renderers import FastJSONRenderer, orjson
+    from order.models import Order, OrderItem
+    from order.serializers import OrderDetailSerializer
+
+    if orjson is None:
+        print("orjson is not installed, FastJSONRenderer falls back to JSONRenderer")
+
+    seed(products=2000, orders=PAGE_SIZE, items_per_order=5)
+    orders = Order.objects.select_related("owner").prefetch_related(
+        Prefetch("orderitem_set", queryset=OrderItem.objects.order_by("id"))
+    )
+    payloads = {
+        f"order list ({PAGE_SIZE} orders)": {"results": OrderDetailSerializer(orders, many=True).data},
+        "sales report": {
+            # generate_sales_report returns raw Decimal totals, rendered as floats
+            "sales": list(OrderItem.objects.values("product", "order__status").annotate(total=Sum("total_price"))),
+            "total_sales_amount": OrderItem.objects.aggregate(total=Sum("total_price"))["total"],
+        },
+    }
+
+    for name, payload in payloads.items():
+        body = JSONRenderer().render(payload)
+        print(f"{name}, {len(body) / 1024:.0f} KiB")
+        print(f"  identical JSON: {FastJSONRenderer().render(payload) == body}")
+        for label, renderer in (("JSONRenderer", JSONRenderer()), ("FastJSONRenderer", FastJSONRenderer())):
+            print(f"  {label:<18} render {timed(lambda: renderer.render(payload), repeat=10):8.2f} ms")
+        for label, parser in (("JSONParser", JSONParser()), ("FastJSONParser", FastJSONParser())):
+            print(f"  {label:<18} parse  {timed(lambda: parser.parse(BytesIO(body)), repeat=10):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+ModelSerializer pages against the values() fast path of core.values, on 1000 row pages.
+
+    python -m benchmarks.serializers
+"""
+from benchmarks.utils import seed, setup_django, timed
+
+PAGE_SIZE = 1000
+
+
+def main():
+    setup_django()
+    from django.db.models import Prefetch
+    from rest_framework.renderers import JSONRenderer
+
+    from core.values import compiled
+    from order.models import Order, OrderItem
+    from order.serializers import OrderDetailSerializer, OrderValuesSerializer
+    from product.models import Product
+    from product.serializers import ListProductSerializer, ProductValuesSerializer
+
+    seed(products=5000, orders=5000, items_per_order=5)
+    renderer = JSONRenderer()
+    cases = {
+        "products": (
+            Product.objects.select_related("created_by").order_by("-created_at", "-id"),
+            ListProductSerializer,
+            ProductValuesSerializer,
+        ),
+        "orders": (
+            Order.objects.select_related("owner")
+            .prefetch_related(Prefetch("orderitem_set", queryset=OrderItem.objects.order_by("id")))
+            .order_by("-created_at", "-id"),
+            OrderDetailSerializer,
+            OrderValuesSerializer,
+        ),
+    }
+
+    for name, (queryset, serializer_class, values_serializer_class) in cases.items():
+        values_serializer = compiled(values_serializer_class)
+
+        def model_serializer():
+            return renderer.render(serializer_class(queryset[:PAGE_SIZE], many=True).data)
+
+        def values_path():
+            return renderer.render(values_serializer.many(values_serializer.values(queryset)[:PAGE_SIZE]))
+
+        slow = timed(model_serializer)
+        fast = timed(values_path)
+        print(f"{name} ({PAGE_SIZE} rows)")
+        print(f"  ModelSerializer  {slow:8.2f} ms")
+        print(f"  values() path    {fast:8.2f} ms   x{slow / fast:.1f}")
+        print(f"  identical JSON: {model_serializer() == values_path()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Each script is run from the project root, e.g. ``python -m benchmarks.indexes``.
+The scripts build a throwaway test database through the regular migrations,
+seed it with bulk inserts and print their measurements.
+"""
+import os
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+def setup_django():
+    """configure django and create a fresh, migrated test database"""
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    return connection
+
+
+def timed(func, repeat=5):
+    """best wall time of func() over repeat runs, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def seed(users=50, products=500, orders=20000, items_per_order=5, seed_value=1):
+    """bulk insert a reproducible dataset and return (users, products)"""
+    from django.utils import timezone
+
+    from order.models import Order, OrderItem
+    from product.models import Product
+    from user.models import User
+
+    rng = random.Random(seed_value)
+    now = timezone.now()
+    user_objs = User.objects.bulk_create(
+        [User(email=f"user{i}@example.com", firstname=f"first{i}", lastname=f"last{i}") for i in range(users)]
+    )
+    product_objs = Product.objects.bulk_create(
+        [
+            Product(
+                name=f"product {i} {rng.choice(['red', 'blue', 'green'])} {rng.choice(['chair', 'table', 'lamp'])}",
+                description=f"description of product {i}",
+                quantity=rng.randint(0, 500),
+                price=Decimal(rng.randint(100, 10000)) / 100,
+                created_by=user_objs[0],
+            )
+            for i in range(products)
+        ]
+    )
+    order_objs = Order.objects.bulk_create(
+        [
+            Order(owner=rng.choice(user_objs), status=rng.choice(["pending", "completed", "cancelled"]))
+            for _ in range(orders)
+        ],
+        batch_size=2000,
+    )
+    # spread the orders over the past year
+    for index, order in enumerate(order_objs):
+        order.created_at = now - timedelta(minutes=index * 26)
+    Order.objects.bulk_update(order_objs, ["created_at"], batch_size=2000)
+
+    items = []
+    for order in order_objs:
+        for product in rng.sample(product_objs, items_per_order):
+            quantity = rng.randint(1, 5)
+            items.append(
+                OrderItem(order=order, product=product, quantity_required=quantity, total_price=quantity * product.price)
+            )
+    OrderItem.objects.bulk_create(items, batch_size=5000)
+    return user_objs, product_objs
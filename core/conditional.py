@@ -0,0 +1,110 @@
+from functools import partial
+from hashlib import md5
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .counts import cached_aggregate, get_count, table_versions
+
+
+def make_etag(*parts):
+    return quote_etag(md5("|".join(str(part) for part in parts).encode()).hexdigest())
+
+
+def is_not_modified(request, etag, last_modified=None):
+    """If-None-Match wins over If-Modified-Since, as in RFC 9110"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+        return "*" in etags or etag in etags
+    if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since") or "")
+    if if_modified_since is None or last_modified is None:
+        return False
+    return int(last_modified.timestamp()) <= if_modified_since
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified validators for list and retrieve, computed with one aggregate query
+    before anything is serialized, so unchanged resources are answered with an empty 304.
+    List ETags hash the request, the user, the write versions of the tables read (see
+    core.counts), the newest updated_at and the row count of the filtered queryset. Views
+    with a cached or estimated count_strategy cache the aggregate and count with it, and
+    the paginator reuses that count. Keyset pages leave the count out unless they report it.
+    Lists only send an ETag since a delete does not move their Last-Modified.
+    """
+
+    last_modified_field = "updated_at"
+
+    def etag_scope(self):
+        user = self.request.user
+        return f"{self.request.get_full_path()}|{getattr(user, 'pk', None)}|{getattr(user, 'role', None)}"
+
+    def conditional_response(self, etag, last_modified, respond):
+        if is_not_modified(self.request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = respond()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        return response
+
+    def list_counts_rows(self):
+        """whether the paginator reports a total, keyset pages only count with ?with_count=true"""
+        counts_rows = getattr(self.paginator, "counts_rows", None)
+        return counts_rows is None or counts_rows(self.request)
+
+    def get_list_validators(self, queryset):
+        """(newest updated_at, row count) of the filtered queryset, the count is None when nothing reports it"""
+        queryset = queryset.order_by()
+        count_strategy = getattr(self, "count_strategy", "exact")
+        if not self.list_counts_rows():
+            aggregate = queryset.aggregate if count_strategy == "exact" else partial(cached_aggregate, queryset)
+            return aggregate(last_modified=Max(self.last_modified_field))["last_modified"], None
+        if count_strategy in ("exact", "cached"):
+            aggregate = queryset.aggregate if count_strategy == "exact" else partial(cached_aggregate, queryset)
+            validators = aggregate(last_modified=Max(self.last_modified_field), count=Count("pk"))
+            return validators["last_modified"], validators["count"]
+        last_modified = cached_aggregate(queryset, last_modified=Max(self.last_modified_field))["last_modified"]
+        return last_modified, get_count(queryset, count_strategy)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        last_modified, self.list_count = self.get_list_validators(queryset)
+        etag = make_etag("list", self.etag_scope(), table_versions(queryset), last_modified, self.list_count)
+        return self.conditional_response(etag, None, lambda: self.list_response(queryset))
+
+    def list_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            last_modified = (
+                self.filter_queryset(self.get_queryset())
+                .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                .order_by()
+                .values_list(self.last_modified_field, flat=True)
+                .first()
+            )
+        except (TypeError, ValueError, ValidationError):
+            last_modified = None
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = make_etag("detail", self.etag_scope(), last_modified)
+        return self.conditional_response(etag, last_modified, lambda: self.retrieve_response(request, *args, **kwargs))
+
+    def retrieve_response(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
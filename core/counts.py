@@ -0,0 +1,120 @@
+"""
+Count strategies for paginated list endpoints.
+
+``exact`` runs COUNT(*) every time, ``cached`` keeps the count of each distinct query for
+COUNT_CACHE_TIMEOUT seconds and ``estimated`` reads the planner statistics for unfiltered
+tables (falling back to ``cached``). Estimates go stale between ANALYZE runs, so views opt in
+explicitly and core.pagination never lets them decide which pages exist. Cached counts (and the list validators of
+core.conditional) are keyed on the SQL of the query and on a version per table, bumped
+whenever a row of the table is saved or deleted.
+Writes that bypass model signals (queryset.update, bulk_create) call invalidate_counts themselves.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+
+COUNT_STRATEGIES = ("exact", "cached", "estimated")
+COUNT_CACHE_TIMEOUT = getattr(settings, "COUNT_CACHE_TIMEOUT", 30)
+
+
+def _version_key(table):
+    return f"counts:version:{table}"
+
+
+def invalidate_counts(*models):
+    """drop every cached count that reads from the tables of these models"""
+    for model in models:
+        key = _version_key(model._meta.db_table)
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+def _invalidate_counts_receiver(sender, **kwargs):
+    invalidate_counts(sender)
+
+
+def connect_count_invalidation(models):
+    """bump the count version of each model whenever one of its rows is saved or deleted"""
+    for model in models:
+        post_save.connect(_invalidate_counts_receiver, sender=model, dispatch_uid=f"counts-save-{model._meta.label}")
+        post_delete.connect(_invalidate_counts_receiver, sender=model, dispatch_uid=f"counts-delete-{model._meta.label}")
+
+
+def table_versions(queryset):
+    """the versions of the tables read by queryset, changes after any write to one of them"""
+    tables = sorted({alias.table_name for alias in queryset.query.alias_map.values()} | {queryset.model._meta.db_table})
+    versions = cache.get_many([_version_key(table) for table in tables])
+    return ",".join(f"{table}:{versions.get(_version_key(table), 0)}" for table in tables)
+
+
+def cached_query(queryset, label, compute, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    compute() cached under the SQL of the queryset and the versions of the tables it reads,
+    used for counts and other small aggregates of list querysets
+    """
+    query = queryset.query.clone()
+    try:
+        sql, params = query.sql_with_params()
+    except EmptyResultSet:
+        return compute()
+    version = table_versions(queryset)
+    digest = md5(f"{label}|{queryset.db}|{sql}|{params!r}|{version}".encode()).hexdigest()
+    key = f"counts:{digest}"
+
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    return cached_query(queryset, "count", queryset.count, timeout)
+
+
+def cached_aggregate(queryset, timeout=COUNT_CACHE_TIMEOUT, **aggregates):
+    label = "aggregate:" + ",".join(f"{name}={expression!r}" for name, expression in sorted(aggregates.items()))
+    return cached_query(queryset, label, lambda: queryset.aggregate(**aggregates), timeout)
+
+
+def _table_estimate(queryset):
+    """row estimate from the planner statistics, or None when there are none"""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+def estimated_count(queryset):
+    query = queryset.query
+    if query.where or query.distinct or query.combinator or query.low_mark or query.high_mark is not None:
+        return cached_count(queryset)
+    estimate = _table_estimate(queryset)
+    return cached_count(queryset) if estimate is None else estimate
+
+
+def get_count(queryset, strategy="exact"):
+    if strategy == "cached":
+        return cached_count(queryset)
+    if strategy == "estimated":
+        return estimated_count(queryset)
+    return queryset.count()
+
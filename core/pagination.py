@@ -1,12 +1,85 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator as DjangoPaginator
+from django.utils.functional import cached_property
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .counts import get_count
+import json
 import math
 
 DEFAULT_PAGE = 1
 
 
+class CountStrategyPaginator(DjangoPaginator):
+    """django paginator that gets its count through one of the core.counts strategies"""
+
+    def __init__(self, object_list, per_page, count_strategy="exact", known_count=None, **kwargs):
+        self.count_strategy = count_strategy
+        self.known_count = known_count
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        if not hasattr(self.object_list, "query"):
+            return len(self.object_list)
+        return get_count(self.object_list, self.count_strategy)
+
+    def page(self, number):
+        if self.count_strategy != "estimated":
+            return super().page(number)
+        # an estimate can be stale, so it never decides which pages exist: the page is read with
+        # one extra row and the count is corrected to at least what has been seen
+        number = self.validate_page_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages["no_results"])
+        if len(rows) > self.per_page:
+            count = max(self.count, bottom + len(rows))
+        else:
+            count = bottom + len(rows)
+        self.__dict__["count"] = count
+        self.__dict__.pop("num_pages", None)
+        return self._get_page(rows[:self.per_page], number, self)
+
+    def validate_page_number(self, number):
+        """the page number as an int, without comparing it with the count"""
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+
 class CustomPagination(PageNumberPagination):
+    """page number pagination, views pick how the total is counted with count_strategy"""
+
+
     page_size_query_param = "page_size"
+    count_strategy = "exact"
+    known_count = None
+
+    def django_paginator_class(self, object_list, per_page, **kwargs):
+        return CountStrategyPaginator(
+            object_list, per_page, count_strategy=self.count_strategy, known_count=self.known_count, **kwargs
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_strategy = getattr(view, "count_strategy", self.count_strategy)
+        # views that already counted the queryset (see core.conditional) hand the count over
+        self.known_count = getattr(view, "list_count", None)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
         return Response(
@@ -16,7 +89,7 @@ class CustomPagination(PageNumberPagination):
                     "previous": self.get_previous_link(),
                 },
                 "total": self.page.paginator.count,
-                "total_pages": math.ceil(self.page.paginator.count / self.page_size),
+                "total_pages": math.ceil(self.page.paginator.count / self.page.paginator.per_page),
                 "current_page": int(self.request.GET.get("page", DEFAULT_PAGE)),
                 "page_size": int(self.request.GET.get("page_size", self.page_size)),
                 "results": data,
@@ -28,3 +101,138 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = "page_size"
     max_page_size = 1000
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (created_at, id), newest first, matching the models' default ordering.
+    Every page costs the same index range scan, and the total is only counted with ?with_count=true.
+    Subclasses can page over another pair of columns with cursor_fields, descending and cursor_parsers.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    count_query_param = "with_count"
+    # read from the rows of a page to build the cursors, the last one has to be unique
+    cursor_fields = ("created_at", "id")
+    descending = True
+    # turn the JSON values of a cursor back into column values, None means invalid
+    cursor_parsers = {"created_at": parse_datetime, "id": int}
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def counts_rows(self, request):
+        return request.query_params.get(self.count_query_param) == "true"
+
+    def encode_cursor(self, instance, reverse):
+        if isinstance(instance, dict):
+            # values() rows, see core.values
+            values = [instance[field] for field in self.cursor_fields]
+        else:
+            values = [getattr(instance, field) for field in self.cursor_fields]
+        position = {
+            field: value.isoformat() if hasattr(value, "isoformat") else value
+            for field, value in zip(self.cursor_fields, values)
+        }
+        position["reverse"] = reverse
+        cursor = urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            values = tuple(self.cursor_parsers[field](position[field]) for field in self.cursor_fields)
+            if None in values:
+                raise ValueError
+            return (*values, bool(position["reverse"]))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.total = None
+        if self.counts_rows(request):
+            # views that already counted the queryset exactly (see core.conditional) hand the count over
+            if getattr(view, "count_strategy", "exact") != "estimated":
+                self.total = getattr(view, "list_count", None)
+            if self.total is None:
+                self.total = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+        # walking back through a descending list reads the index ascending and vice versa
+        ascending = self.descending == reverse
+        first, second = self.cursor_fields
+        if cursor:
+            first_value, second_value, _ = cursor
+            lookup = "gt" if ascending else "lt"
+            queryset = queryset.filter(
+                Q(**{f"{first}__{lookup}": first_value}) | Q(**{first: first_value, f"{second}__{lookup}": second_value})
+            )
+        ordering = (first, second) if ascending else (f"-{first}", f"-{second}")
+
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = {
+            "links": {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+            },
+            "page_size": self.page_size,
+            "results": data,
+        }
+        if self.total is not None:
+            response["total"] = self.total
+        return Response(response)
+
+
+class CursorPaginationMixin:
+    """lets list endpoints opt into KeysetPagination with ?pagination=cursor"""
+
+    cursor_pagination_class = KeysetPagination
+    pagination_mode_query_param = "pagination"
+
+    @property
+    def paginator(self):
+        if (
+            not hasattr(self, "_paginator")
+            and self.request is not None
+            and self.request.query_params.get(self.pagination_mode_query_param) == "cursor"
+        ):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
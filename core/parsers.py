@@ -0,0 +1,80 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils import json as drf_json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+
+# orjson reads integers beyond 64 bits as floats, documents with 19 digits in a row are left to json
+DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+LONG_NUMBER = b"0" * 19
+
+
+def loads(content, parse_constant=None):
+    """json.loads through orjson when it is installed, anything orjson rejects is left to json"""
+    if orjson is not None:
+        raw = content if isinstance(content, bytes) else content.encode()
+        if raw.translate(DIGITS_TO_ZERO).find(LONG_NUMBER) == -1:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass
+    return json.loads(content, parse_constant=parse_constant)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding with orjson when it is installed, errors are reported as JSONParser does"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if codecs.lookup(encoding).name != "utf-8":
+                content = content.decode(encoding)
+            parse_constant = drf_json.strict_constant if self.strict else None
+            return loads(content, parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """Parses newline delimited JSON into a list, one item per non-empty line."""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        records = []
+        for line_number, line in enumerate(stream, start=1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                records.append(loads(line))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error on line {line_number} - {exc}")
+        return records
+
+
+class CSVParser(BaseParser):
+    """Parses CSV with a header row into a list of dicts, one per row, values are left as strings."""
+
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            return list(csv.DictReader(line.decode(encoding) for line in stream))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f"CSV parse error - {exc}")
@@ -0,0 +1,72 @@
+"""
+JSON renderer backed by orjson when it is installed.
+
+The output is byte for byte what rest_framework's JSONRenderer produces: datetimes, dates,
+times, decimals and every other non-native type go through DRF's JSONEncoder.default, and
+anything orjson would write differently (integers over 64 bits, non-string keys, decimals
+Python prints in exponent notation, indented output) is rendered by JSONRenderer itself.
+Two cases cannot be detected up front: native floats Python prints in exponent notation come
+out in orjson's shorter form (1e16 rather than 1e+16), and NaN/Infinity, which JSONRenderer
+refuses, are written as null.
+"""
+import decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson is not None else 0
+)
+
+
+class Unsupported(TypeError):
+    """raised from the orjson default hook to fall back to the stdlib encoder"""
+
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        value = float(obj)
+        # repr() switches to exponent notation outside this range and orjson writes it differently
+        if value and not 1e-4 <= abs(value) < 1e16:
+            raise Unsupported
+        return value
+    return _encoder.default(obj)
+
+
+def dumps(data):
+    """compact UTF-8 JSON for data, or None when orjson is missing or would not match json.dumps"""
+    if orjson is None:
+        return None
+    try:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        return None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer writing through orjson, see the module docstring"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        fast = (
+            self.ensure_ascii is False
+            and self.compact
+            and api_settings.STRICT_JSON
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        )
+        ret = dumps(data) if fast else None
+        if ret is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping as JSONRenderer, see rest_framework.renderers
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -66,6 +66,16 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated"),
+    # orjson backed when installed, same output as the rest_framework classes
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "core.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_PAGINATION_CLASS": "core.pagination.CustomPagination",
     "PAGE_SIZE": 10,
 }
@@ -77,6 +87,10 @@ SPECTACULAR_SETTINGS = {
     "SERVE_PERMISSIONS": ["rest_framework.permissions.AllowAny"],
     "COMPONENT_SPLIT_PATCH": True,
     "COMPONENT_SPLIT_REQUEST": True,
+    "ENUM_NAME_OVERRIDES": {
+        "OrderStatusEnum": "order.enums.ORDER_STATUSES",
+        "ReportJobStatusEnum": "order.enums.REPORT_JOB_STATUSES",
+    },
     "SWAGGER_UI_SETTINGS": {
         "deepLinking": True,
         "persistAuthorization": True,
@@ -129,6 +143,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "inventory-management-system",
+    }
+}
+
+# cache alias and timeout (seconds) of the product payload and price/stock cache, order items
+# are priced from it, so deployments with several processes need a shared backend here
+PRODUCT_CACHE_ALIAS = "default"
+PRODUCT_CACHE_TIMEOUT = 300
+
+# seconds a paginated list count is reused for views with count_strategy "cached" or "estimated"
+COUNT_CACHE_TIMEOUT = 30
+
+# seconds a report job result is kept, and after which a running job is assumed dead and requeued
+REPORT_JOB_RESULT_TTL = 24 * 60 * 60
+REPORT_JOB_TIMEOUT = 30 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
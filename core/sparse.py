@@ -0,0 +1,114 @@
+"""
+Sparse fieldsets: ``?fields=id,name`` keeps only those serializer fields, ``?exclude=created_by``
+drops some. Both trim the SQL as well: only() the columns the remaining fields read, and the
+select_related/prefetch_related lookups they do not need are dropped.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .values import source_lookup
+
+FIELDS_PARAM = "fields"
+EXCLUDE_PARAM = "exclude"
+
+
+def parse_field_list(value):
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def select_field_names(available, fields=(), exclude=()):
+    """the names of available kept by fields/exclude, in serializer order"""
+    unknown = [name for name in [*fields, *exclude] if name not in available]
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: [f"Unknown field(s): {', '.join(dict.fromkeys(unknown))}"]})
+    return tuple(name for name in available if (not fields or name in fields) and name not in exclude)
+
+
+def sparse_queryset(queryset, serializer_fields, extra_columns=()):
+    """queryset reading only what serializer_fields ({name: field}) and extra_columns need"""
+    model = queryset.model
+    select_related = queryset.query.select_related
+    joined = set(select_related) if isinstance(select_related, dict) else set()
+    columns, relations, nested = {model._meta.pk.name, *extra_columns}, set(), set()
+    for name, field in serializer_fields.items():
+        if isinstance(field, serializers.ListSerializer):
+            nested.add(field.source_attrs[0])
+            continue
+        try:
+            lookup = source_lookup(model, field.source_attrs, name)
+        except ImproperlyConfigured:
+            # read through a python attribute, e.g. a property of a related object
+            columns = None
+            relations.add(field.source_attrs[0])
+            continue
+        relation = lookup.split("__")[0]
+        if relation != lookup:
+            relations.add(relation)
+            # columns of relations that are not joined are read through the foreign key
+            lookup = lookup if relation in joined else relation
+        if columns is not None:
+            columns.add(lookup)
+
+    if joined:
+        queryset = queryset.select_related(None).select_related(*(joined & relations))
+    prefetches = [
+        lookup
+        for lookup in queryset._prefetch_related_lookups
+        if getattr(lookup, "prefetch_to", lookup).split("__")[0] in nested
+    ]
+    queryset = queryset.prefetch_related(None).prefetch_related(*prefetches)
+    if columns is not None:
+        # only() must keep the foreign keys select_related follows
+        queryset = queryset.only(*columns, *(joined & relations))
+    return queryset
+
+
+class SparseFieldsMixin:
+    """?fields= and ?exclude= for the list and retrieve actions of a viewset"""
+
+    sparse_actions = ("list", "retrieve")
+
+    def get_selected_field_names(self, serializer_class=None):
+        """the serializer fields requested with ?fields=/?exclude=, None when every field is wanted"""
+        if self.request is None or getattr(self, "action", None) not in self.sparse_actions:
+            return None
+        fields = parse_field_list(self.request.query_params.get(FIELDS_PARAM))
+        exclude = parse_field_list(self.request.query_params.get(EXCLUDE_PARAM))
+        if not fields and not exclude:
+            return None
+        serializer_class = serializer_class or self.get_serializer_class()
+        return select_field_names(list(serializer_class().fields), fields, exclude)
+
+    def select_fields(self, data):
+        """drop the unrequested fields of an already serialized object"""
+        field_names = self.get_selected_field_names()
+        if field_names is None:
+            return data
+        return {name: data[name] for name in field_names if name in data}
+
+    def get_values_field_names(self):
+        return self.get_selected_field_names()
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        field_names = self.get_selected_field_names()
+        if field_names is not None:
+            fields = (serializer.child if isinstance(serializer, serializers.ListSerializer) else serializer).fields
+            for name in list(fields):
+                if name not in field_names:
+                    fields.pop(name)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        # trimmed last, after whatever get_queryset and the filter backends added
+        queryset = super().filter_queryset(queryset)
+        field_names = self.get_selected_field_names()
+        if field_names is None:
+            return queryset
+        fields = self.get_serializer_class()().fields
+        return sparse_queryset(
+            queryset,
+            {name: fields[name] for name in field_names},
+            extra_columns=getattr(self.paginator, "cursor_fields", ()),
+        )
@@ -0,0 +1,70 @@
+import datetime
+import uuid
+from decimal import Decimal
+from io import BytesIO
+
+import pytest
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from core import parsers, renderers
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+PAYLOADS = [
+    None,
+    {"price": Decimal("12.50"), "ratio": Decimal("0.0001"), "zero": Decimal("0")},
+    {"big": Decimal("12345678901234567"), "tiny": Decimal("0.00001")},
+    [
+        datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=1))),
+        datetime.datetime(2024, 5, 1, 12, 30),
+        datetime.date(2024, 5, 1),
+        datetime.time(8, 15, 0, 500),
+        datetime.timedelta(minutes=3),
+    ],
+    {"id": uuid.UUID("12345678-1234-5678-1234-567812345678"), "label": gettext_lazy("Order")},
+    ReturnDict({"name": "line separator é", "nested": [{"total": 1.5, "ok": True}]}, serializer=None),
+    {"huge": 2 ** 70, 1: "int key"},
+]
+
+
+class TestFastJSON:
+    @pytest.mark.parametrize("payload", PAYLOADS)
+    def test_renderer_matches_json_renderer(self, payload):
+        assert FastJSONRenderer().render(payload) == JSONRenderer().render(payload)
+
+    def test_renderer_refuses_nan(self):
+        with pytest.raises(ValueError):
+            FastJSONRenderer().render({"total": Decimal("NaN")})
+
+    def test_renderer_honours_indent(self):
+        payload = {"a": [1, 2]}
+        context = {"indent": 2}
+        assert FastJSONRenderer().render(payload, renderer_context=context) == JSONRenderer().render(
+            payload, renderer_context=context
+        )
+
+    @pytest.mark.parametrize("payload", PAYLOADS[1:3])
+    def test_renderer_without_orjson(self, payload, monkeypatch):
+        monkeypatch.setattr(renderers, "orjson", None)
+        assert FastJSONRenderer().render(payload) == JSONRenderer().render(payload)
+
+    @pytest.mark.parametrize(
+        "body", [b'{"items": [{"product": 1, "quantity_required": 2}]}', b'[1.5, "\\u00e9", 123456789012345678901234]']
+    )
+    def test_parser_matches_json_parser(self, body, monkeypatch):
+        assert FastJSONParser().parse(BytesIO(body)) == JSONParser().parse(BytesIO(body))
+        monkeypatch.setattr(parsers, "orjson", None)
+        assert FastJSONParser().parse(BytesIO(body)) == JSONParser().parse(BytesIO(body))
+
+    @pytest.mark.parametrize("body", [b'{"a": ', b'{"a": NaN}'])
+    def test_parser_rejects_what_json_parser_rejects(self, body):
+        with pytest.raises(ParseError) as fast_error:
+            FastJSONParser().parse(BytesIO(body))
+        with pytest.raises(ParseError) as error:
+            JSONParser().parse(BytesIO(body))
+        assert str(fast_error.value) == str(error.value)
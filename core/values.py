@@ -0,0 +1,257 @@
+"""
+Fast read path for list and retrieve endpoints.
+
+A ValuesSerializer is compiled once from a read-only ModelSerializer: every field becomes a
+values() lookup and a plain converter reproducing the field's to_representation, and nested
+many=True serializers over reverse foreign keys become one extra values() query per page.
+Rows never become model instances, and the output is the same JSON as the ModelSerializer.
+Fields that cannot be read from a column (properties, method fields) are declared in
+``computed`` as (lookups, function).
+"""
+import decimal
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.http import Http404
+from rest_framework import ISO_8601, serializers
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    rounding = field.rounding
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f"{value.quantize(exponent, rounding=rounding, context=context):f}"
+
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    def convert(value):
+        value = field.enforce_timezone(value).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return convert
+
+
+def field_converter(field):
+    """a function turning a column value into what field.to_representation returns for it"""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        return (lambda value: value) if field.pk_field is None else field.pk_field.to_representation
+    if isinstance(field, serializers.StringRelatedField):
+        return str
+    if isinstance(field, serializers.RelatedField):
+        raise ImproperlyConfigured(f"{type(field).__name__} '{field.field_name}' needs model instances")
+    if isinstance(field, serializers.ChoiceField):
+        choices = field.choice_strings_to_values
+        return lambda value: value if value == "" else choices.get(str(value), value)
+    if isinstance(field, serializers.BooleanField):
+        return field.to_representation
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, (serializers.SerializerMethodField, serializers.HiddenField)):
+        raise ImproperlyConfigured(f"{type(field).__name__} '{field.field_name}' needs model instances")
+    return field.to_representation
+
+
+def source_lookup(model, source_attrs, field_name):
+    """the values() lookup for a dotted serializer source, e.g. created_by.firstname -> created_by__firstname"""
+    for position, attr in enumerate(source_attrs):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(f"Field '{field_name}' is not a column, declare it in computed")
+        if model_field.is_relation and position < len(source_attrs) - 1:
+            model = model_field.related_model
+        elif position < len(source_attrs) - 1:
+            raise ImproperlyConfigured(f"Field '{field_name}' is not a column, declare it in computed")
+    return "__".join(source_attrs)
+
+
+class ValuesSerializer:
+    """
+    Read-only twin of serializer_class rendering values() rows, see the module docstring.
+    Subclasses only set serializer_class and, when needed, computed. field_names restricts
+    the output, and the columns read, to some of the serializer fields.
+    """
+
+    serializer_class = None
+    computed = {}
+
+    def __init__(self, field_names=None):
+        serializer = self.serializer_class()
+        self.model = serializer.Meta.model
+        self.pk = self.model._meta.pk.attname
+        self.columns = []
+        self.nested = []
+        lookups = {self.pk}
+
+        for name, field in serializer.fields.items():
+            if field.write_only or (field_names is not None and name not in field_names):
+                continue
+            if name in self.computed:
+                sources, function = self.computed[name]
+                lookups.update(sources)
+                self.columns.append((name, self._computed_getter(sources, function, field_converter(field))))
+            elif isinstance(field, serializers.ListSerializer):
+                foreign_key, child = self._compile_nested(name, field)
+                self.nested.append((name, foreign_key, child))
+                self.columns.append((name, self._nested_getter(name)))
+            elif isinstance(field, serializers.BaseSerializer):
+                raise ImproperlyConfigured(f"Nested serializer '{name}' is not supported")
+            else:
+                lookup = source_lookup(self.model, field.source_attrs, name)
+                lookups.add(lookup)
+                self.columns.append((name, self._column_getter(lookup, field_converter(field))))
+        self.lookups = sorted(lookups)
+
+    @staticmethod
+    def _column_getter(lookup, convert):
+        def get(row, children):
+            value = row[lookup]
+            return None if value is None else convert(value)
+
+        return get
+
+    @staticmethod
+    def _computed_getter(sources, function, convert):
+        def get(row, children):
+            value = function(*(row[source] for source in sources))
+            return None if value is None else convert(value)
+
+        return get
+
+    def _nested_getter(self, name):
+        pk = self.pk
+
+        def get(row, children):
+            return children[name].get(row[pk], [])
+
+        return get
+
+    def _compile_nested(self, name, field):
+        accessor = field.source_attrs[-1]
+        relations = [rel for rel in self.model._meta.related_objects if rel.get_accessor_name() == accessor]
+        if len(field.source_attrs) != 1 or not relations or not isinstance(field.child, serializers.ModelSerializer):
+            raise ImproperlyConfigured(f"Nested serializer '{name}' must be a reverse foreign key")
+        child = compiled(
+            type(f"{type(field.child).__name__}Values", (ValuesSerializer,), {"serializer_class": type(field.child)})
+        )
+        if child.nested:
+            raise ImproperlyConfigured(f"Nested serializer '{name}' cannot nest serializers itself")
+        return relations[0].field.attname, child
+
+    def values(self, queryset, *extra):
+        """the queryset as the rows this serializer renders, with the extra lookups"""
+        return queryset.prefetch_related(None).values(*self.lookups, *extra)
+
+    def to_representation(self, row, children=None):
+        return {name: get(row, children) for name, get in self.columns}
+
+    def many(self, rows):
+        """render rows, fetching the nested rows of the whole page with one query per nested serializer"""
+        rows = list(rows)
+        children = {}
+        if self.nested:
+            pks = [row[self.pk] for row in rows]
+            for name, foreign_key, child in self.nested:
+                grouped = defaultdict(list)
+                child_rows = child.model._default_manager.filter(**{f"{foreign_key}__in": pks}).order_by("pk")
+                for child_row in child_rows.values(*child.lookups, foreign_key):
+                    grouped[child_row[foreign_key]].append(child.to_representation(child_row))
+                children[name] = grouped
+        return [self.to_representation(row, children) for row in rows]
+
+
+_compiled = {}
+
+
+def compiled(values_serializer_class, field_names=None):
+    """the shared instance of a ValuesSerializer class for field_names, compiled on first use"""
+    key = (values_serializer_class, None if field_names is None else tuple(field_names))
+    if key not in _compiled:
+        _compiled[key] = values_serializer_class(field_names)
+    return _compiled[key]
+
+
+class ValuesReadMixin:
+    """
+    Serves list and retrieve through the values_serializer_classes entry mirroring the
+    serializer of the action, when there is one. Goes before ConditionalGetMixin, whose list/retrieve responses it
+    replaces. Detail views whose permissions check objects keep the regular path.
+    """
+
+    values_serializer_classes = ()
+
+    def get_values_field_names(self):
+        """the serializer fields to render, None for all of them"""
+        return None
+
+    def get_values_serializer(self, all_fields=False):
+        if self.action not in ("list", "retrieve"):
+            return None
+        serializer_class = self.get_serializer_class()
+        for values_serializer_class in self.values_serializer_classes:
+            if values_serializer_class.serializer_class is serializer_class:
+                field_names = None if all_fields else self.get_values_field_names()
+                return compiled(values_serializer_class, field_names)
+        return None
+
+    def list_response(self, queryset):
+        values_serializer = self.get_values_serializer()
+        if values_serializer is None:
+            return super().list_response(queryset)
+        rows = values_serializer.values(queryset, *getattr(self.paginator, "cursor_fields", ()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.many(page))
+        return Response(values_serializer.many(rows))
+
+    def checks_object_permissions(self):
+        return any(
+            type(permission).has_object_permission is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
+
+    def get_object_data(self, all_fields=False):
+        """the serialized object of a detail route, all_fields ignores get_values_field_names"""
+        values_serializer = self.get_values_serializer(all_fields)
+        if values_serializer is None or self.checks_object_permissions():
+            serializer_class = self.get_serializer_class()
+            if all_fields:
+                return serializer_class(self.get_object(), context=self.get_serializer_context()).data
+            return self.get_serializer(self.get_object()).data
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            rows = values_serializer.values(queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}))
+            row = rows.order_by()[:1].get()
+        except (TypeError, ValueError, ValidationError, queryset.model.DoesNotExist):
+            raise Http404
+        return values_serializer.many([row])[0]
+
+    def retrieve_response(self, request, *args, **kwargs):
+        if self.get_values_serializer() is None:
+            return super().retrieve_response(request, *args, **kwargs)
+        return Response(self.get_object_data())
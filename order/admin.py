@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Order,OrderItem
+from .models import Order,OrderItem,DailySalesRollup,CustomerProductSummary,ReportJob
 # Register your models here.
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(DailySalesRollup)
+admin.site.register(CustomerProductSummary)
+admin.site.register(ReportJob)
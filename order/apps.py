@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'order'
+
+    def ready(self):
+        from core.counts import connect_count_invalidation
+
+        connect_count_invalidation(self.get_models())
@@ -3,3 +3,31 @@ ORDER_STATUSES = (
     ("completed", "completed"),
     ("cancelled", "cancelled"),
 )
+
+# status: the statuses an order can move to from it, completed orders are final
+ORDER_STATUS_TRANSITIONS = {
+    "pending": ("completed", "cancelled"),
+    "completed": (),
+    "cancelled": ("pending",),
+}
+
+# status: the statuses an order can reach it from, the guard of every status UPDATE
+ORDER_STATUS_SOURCES = {
+    status: tuple(source for source, targets in ORDER_STATUS_TRANSITIONS.items() if status in targets)
+    for status, _ in ORDER_STATUSES
+}
+
+REPORT_KINDS = (
+    ("sales", "sales"),
+    ("frequent_purchased_products", "frequent_purchased_products"),
+)
+
+REPORT_JOB_STATUSES = (
+    ("queued", "queued"),
+    ("running", "running"),
+    ("completed", "completed"),
+    ("failed", "failed"),
+)
+
+# jobs a worker still has to build, identical requests share these
+ACTIVE_REPORT_JOB_STATUSES = ("queued", "running")
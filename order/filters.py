@@ -0,0 +1,47 @@
+from django.db.models import Exists, OuterRef, Q
+from django_filters import rest_framework as django_filters
+from rest_framework import filters
+
+from product.models import Product
+
+from .models import Order, OrderItem
+
+
+class OrderFilter(django_filters.FilterSet):
+    """owner and status filters, and order value ranges served by the total_amount index"""
+
+    min_total = django_filters.NumberFilter(field_name="total_amount", lookup_expr="gte")
+    max_total = django_filters.NumberFilter(field_name="total_amount", lookup_expr="lte")
+
+    class Meta:
+        model = Order
+        fields = ["owner", "status", "min_total", "max_total"]
+
+
+class OrderProductSearchFilter(filters.SearchFilter):
+    """
+    Searches orders by the fields of the products they contain, every search term has to match the same product.
+    Orders are kept with an EXISTS subquery on their items whose product is in the matching
+    products subquery, so every order comes back once without joining products.
+    """
+
+    search_description = "A search term matched against the name and description of the ordered products."
+
+    def get_product_search_fields(self, view, request):
+        return getattr(view, "product_search_fields", None)
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_product_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+
+        product_condition = Q()
+        for term in search_terms:
+            term_condition = Q()
+            for field in search_fields:
+                term_condition |= Q(**{f"{field}__icontains": term})
+            product_condition &= term_condition
+
+        product_ids = Product.objects.filter(product_condition).order_by().values("id")
+        return queryset.filter(Exists(OrderItem.objects.filter(order=OuterRef("pk"), product_id__in=product_ids)))
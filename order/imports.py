@@ -0,0 +1,136 @@
+from collections import Counter
+
+from django.db import DatabaseError, transaction
+
+from product.cache import get_price_quantities
+from product.models import Product
+from user.models import User
+
+from .enums import ORDER_STATUSES
+from .models import Order, OrderItem
+from .services import holds_stock, item_quantities, place_orders
+
+IMPORT_BATCH_SIZE = 500
+VALID_STATUSES = {choice for choice, _ in ORDER_STATUSES}
+
+
+def _as_id(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def _validate_record(record, owner_ids, prices):
+    """return (order, items, None) for a valid record or (None, None, errors)"""
+    if not isinstance(record, dict):
+        return None, None, {"errors": ["Expected an object with owner and items"]}
+
+    errors = {}
+    owner_id = _as_id(record.get("owner"))
+    if owner_id not in owner_ids:
+        errors["owner"] = [f"Invalid owner id: {record.get('owner')}"]
+
+    order_status = record.get("status", "pending")
+    if order_status not in VALID_STATUSES:
+        errors["status"] = [f"Invalid status: {order_status}"]
+
+    raw_items = record.get("items")
+    if not isinstance(raw_items, list) or not raw_items:
+        errors["items"] = ["Expected a non-empty list of items"]
+        return None, None, errors
+
+    items, item_errors = [], {}
+    for index, raw_item in enumerate(raw_items):
+        if not isinstance(raw_item, dict):
+            item_errors[index] = ["Expected an object with product and quantity_required"]
+            continue
+        product_id = _as_id(raw_item.get("product"))
+        quantity_required = raw_item.get("quantity_required")
+        if product_id not in prices:
+            item_errors[index] = [f"Invalid product id: {raw_item.get('product')}"]
+        elif isinstance(quantity_required, bool) or not isinstance(quantity_required, int) or quantity_required <= 0:
+            item_errors[index] = ["Product quantity must  be greater than zero"]
+        else:
+            total_price = round(quantity_required * prices[product_id], 2)
+            items.append(OrderItem(product_id=product_id, quantity_required=quantity_required, total_price=total_price))
+    if item_errors:
+        errors["items"] = item_errors
+
+    if errors:
+        return None, None, errors
+    return Order(owner_id=owner_id, status=order_status), items, None
+
+
+def _allocate_stock(batch):
+    """reserve stock for the batch record by record, returns the records that fit"""
+    needed = Counter()
+    for _, order, items in batch:
+        if holds_stock(order.status):
+            needed.update(item_quantities(items))
+    available = Counter({pk: quantity or 0 for pk, quantity in Product.objects.lock_stock(needed).items()})
+
+    accepted, rejected, reserved = [], [], Counter()
+    for index, order, items in batch:
+        quantities = item_quantities(items) if holds_stock(order.status) else Counter()
+        shortages = [
+            f"Insufficient stock for product {pk}: requested {quantity}, available {available[pk] - reserved[pk]}"
+            for pk, quantity in sorted(quantities.items())
+            if available[pk] - reserved[pk] < quantity
+        ]
+        if shortages:
+            rejected.append((index, {"errors": shortages}))
+            continue
+        reserved.update(quantities)
+        accepted.append((index, order, items))
+    Product.objects.reserve_stock(reserved)
+    return accepted, rejected
+
+
+def import_orders(records, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate and insert many orders at once, each batch of batch_size orders in its own transaction.
+    Returns one result per record, in input order, with the created order id or the errors.
+    """
+    records = list(records)
+    product_ids, owner_ids = set(), set()
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        owner_ids.add(_as_id(record.get("owner")))
+        for item in record.get("items") or []:
+            if isinstance(item, dict):
+                product_ids.add(_as_id(item.get("product")))
+    product_ids.discard(None)
+    owner_ids.discard(None)
+
+    prices = {pk: price for pk, (price, _) in get_price_quantities(product_ids).items()}
+    owner_ids = set(User.objects.filter(id__in=owner_ids).values_list("id", flat=True))
+
+    results = [None] * len(records)
+    valid = []
+    for index, record in enumerate(records):
+        order, items, errors = _validate_record(record, owner_ids, prices)
+        if errors:
+            results[index] = {"index": index, "success": False, "errors": errors}
+        else:
+            valid.append((index, order, items))
+
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        try:
+            with transaction.atomic():
+                accepted, rejected = _allocate_stock(batch)
+                place_orders([(order, items) for _, order, items in accepted])
+        except DatabaseError as error:
+            for index, _, _ in batch:
+                results[index] = {"index": index, "success": False, "errors": {"errors": [str(error)]}}
+            continue
+        for index, errors in rejected:
+            results[index] = {"index": index, "success": False, "errors": errors}
+        for index, order, _ in accepted:
+            results[index] = {"index": index, "success": True, "order": order.pk}
+    return results
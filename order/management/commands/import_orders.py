@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from order.imports import IMPORT_BATCH_SIZE, import_orders
+
+
+def read_records(path):
+    """read a JSON array, or NDJSON when the file does not start with '['"""
+    with open(path, encoding="utf-8") as handle:
+        content = handle.read()
+    try:
+        if content.lstrip().startswith("["):
+            return json.loads(content)
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    except ValueError as exc:
+        raise CommandError(f"Could not parse {path}: {exc}")
+
+
+class Command(BaseCommand):
+    help = "Import orders from a JSON array or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON or NDJSON file with one order (owner, status, items) per record")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be a positive number")
+
+        results = import_orders(read_records(options["path"]), options["batch_size"])
+        failed = [result for result in results if not result["success"]]
+        for result in failed:
+            self.stderr.write(f"record {result['index']}: {json.dumps(result['errors'])}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {len(results) - len(failed)} orders, {len(failed)} failed")
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from order.rollups import ROLLUP_BATCH_SIZE, rebuild_customer_summaries
+
+
+class Command(BaseCommand):
+    help = "Backfill or rebuild the customer product summaries from order items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, help="only rebuild the summaries of this user id")
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        written = rebuild_customer_summaries(options["owner"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} customer product summary rows"))
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from order.rollups import ROLLUP_BATCH_SIZE, rebuild_rollups
+
+
+def parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Backfill or rebuild the daily sales rollup from order items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-date", type=parse_day, help="first day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--end-date", type=parse_day, help="last day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups(options["start_date"], options["end_date"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily sales rollup rows"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from order.services import ORDER_TOTALS_BATCH_SIZE, recompute_order_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored item_count and total_amount of orders from their items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ORDER_TOTALS_BATCH_SIZE)
+        parser.add_argument(
+            "--verify", action="store_true", help="only report orders whose totals drifted, fail if there are any"
+        )
+
+    def handle(self, *args, **options):
+        checked, mismatched = recompute_order_totals(
+            options["batch_size"], fix=not options["verify"], stdout=self.stdout
+        )
+        if options["verify"]:
+            if mismatched:
+                raise CommandError(f"{mismatched} of {checked} orders have drifted totals")
+            self.stdout.write(self.style.SUCCESS(f"Verified the totals of {checked} orders"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} orders, fixed {mismatched}"))
@@ -0,0 +1,50 @@
+import os
+import socket
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from order.report_jobs import REPORT_JOB_POLL_INTERVAL, process_report_jobs
+
+
+class Command(BaseCommand):
+    help = "Build queued report jobs with a pool of worker threads, polling the database for new jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="number of worker threads")
+        parser.add_argument("--poll-interval", type=float, default=REPORT_JOB_POLL_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        if options["workers"] <= 0:
+            raise CommandError("--workers must be a positive number")
+        stop = threading.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        if options["workers"] == 1:
+            processed = [process_report_jobs(f"{prefix}:0", stop, options["poll_interval"], options["once"])]
+        else:
+            processed = [0] * options["workers"]
+
+            def work(index):
+                try:
+                    processed[index] = process_report_jobs(
+                        f"{prefix}:{index}", stop, options["poll_interval"], options["once"]
+                    )
+                finally:
+                    # every thread has its own connection
+                    connection.close()
+
+            threads = [threading.Thread(target=work, args=(index,), daemon=True) for index in range(options["workers"])]
+            for thread in threads:
+                thread.start()
+            try:
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=1)
+            except KeyboardInterrupt:
+                # running jobs are finished, nothing new is claimed
+                stop.set()
+                for thread in threads:
+                    thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Built {sum(processed)} report jobs"))
@@ -0,0 +1,25 @@
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def with_computed_totals(self):
+        """
+        Annotate computed_item_count and computed_total_amount from the items, to check the stored
+        item_count and total_amount. Correlated subqueries are only evaluated for the rows returned.
+        """
+        from .models import OrderItem
+
+        items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+        return self.annotate(
+            computed_item_count=Coalesce(Subquery(items.annotate(count=Count("id")).values("count")), 0),
+            computed_total_amount=Coalesce(
+                Subquery(items.annotate(total=Sum("total_price")).values("total")),
+                Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:11
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_sales_rollup(apps, schema_editor):
+    # the same rows as order.rollups.rebuild_rollups, so edits to older orders apply to a full rollup
+    DailySalesRollup = apps.get_model('order', 'DailySalesRollup')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    rows = (
+        OrderItem.objects.annotate(day=TruncDate('order__created_at'), status=F('order__status'))
+        .values('day', 'product', 'status')
+        .annotate(
+            quantity_sold=Sum('quantity_required'),
+            total_sales_amount=Sum('total_price'),
+            item_count=Count('id'),
+        )
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        (
+            DailySalesRollup(
+                day=row['day'],
+                product_id=row['product'],
+                status=row['status'],
+                quantity_sold=row['quantity_sold'] or 0,
+                total_sales_amount=row['total_sales_amount'] or Decimal('0.00'),
+                item_count=row['item_count'],
+            )
+            for row in rows.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0002_alter_order_options'),
+        ('product', '0002_alter_product_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('completed', 'completed'), ('cancelled', 'cancelled')], max_length=20)),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('total_sales_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('item_count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='product.product')),
+            ],
+            options={
+                'ordering': ('day', 'product', 'status'),
+                'constraints': [models.UniqueConstraint(fields=('day', 'product', 'status'), name='unique_daily_sales_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_sales_rollup, migrations.RunPython.noop),
+    ]
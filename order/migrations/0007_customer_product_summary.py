@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_customer_product_summaries(apps, schema_editor):
+    CustomerProductSummary = apps.get_model('order', 'CustomerProductSummary')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    rows = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .values('order__owner', 'product')
+        .annotate(
+            total_quantity=Sum('quantity_required'),
+            total_spend=Sum('total_price'),
+            item_count=Count('id'),
+            last_purchased_at=Max('order__created_at'),
+        )
+        .order_by()
+    )
+    CustomerProductSummary.objects.bulk_create(
+        (
+            CustomerProductSummary(
+                owner_id=row['order__owner'],
+                product_id=row['product'],
+                total_quantity=row['total_quantity'] or 0,
+                total_spend=row['total_spend'] or Decimal('0.00'),
+                item_count=row['item_count'],
+                last_purchased_at=row['last_purchased_at'],
+            )
+            for row in rows.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0006_report_jobs'),
+        ('product', '0003_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerProductSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('total_spend', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('item_count', models.IntegerField(default=0)),
+                ('last_purchased_at', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_summaries', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_summaries', to='product.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-total_quantity', 'product'], name='customer_summary_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'product'), name='unique_customer_product_summary')],
+            },
+        ),
+        migrations.RunPython(backfill_customer_product_summaries, migrations.RunPython.noop),
+    ]
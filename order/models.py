@@ -1,6 +1,7 @@
 from django.db import models
 from decimal import Decimal
-from .enums import ORDER_STATUSES
+from .enums import ACTIVE_REPORT_JOB_STATUSES, ORDER_STATUSES, REPORT_JOB_STATUSES, REPORT_KINDS
+from .managers import OrderQuerySet
 from product.models import Product
 from user.models import User
 
@@ -11,14 +12,25 @@ def default_status():
 class Order(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="placed_orders")
     status = models.CharField(max_length=20, choices=ORDER_STATUSES, default=default_status)
+    # denormalized from the items by order.services, checked by the recompute_order_totals command
+    item_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal(0.00))
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    objects = OrderQuerySet.as_manager()
+
     def __str__(self):
         return f"Order {self.pk} placed by {self.owner.fullname}"
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_at_id_idx'),
+            models.Index(fields=['owner', 'status', '-created_at'], name='order_owner_status_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'), name='order_pending_created_idx'),
+            models.Index(fields=['total_amount'], name='order_total_amount_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -31,4 +43,84 @@ class OrderItem(models.Model):
 
         return f"Order Item {self.pk} for product {self.product.name}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'product'], name='orderitem_order_product_idx'),
+        ]
+
+
+class DailySalesRollup(models.Model):
+    """sales per day, per product and per order status, maintained as orders change"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    status = models.CharField(max_length=20, choices=ORDER_STATUSES)
+    quantity_sold = models.IntegerField(default=0)
+    total_sales_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal(0.00))
+    item_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Sales of product {self.product_id} on {self.day} ({self.status})"
+
+    class Meta:
+        ordering = ('day', 'product', 'status')
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product', 'status'], name='unique_daily_sales_rollup'),
+        ]
+
+
+class CustomerProductSummary(models.Model):
+    """what a customer bought of a product over all their orders that are not cancelled, maintained as orders change"""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="product_summaries")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="customer_summaries")
+    total_quantity = models.IntegerField(default=0)
+    total_spend = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal(0.00))
+    item_count = models.IntegerField(default=0)
+    last_purchased_at = models.DateTimeField(null=True, blank=True)
 
+    def __str__(self):
+        return f"Purchases of product {self.product_id} by user {self.owner_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'product'], name='unique_customer_product_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-total_quantity', 'product'], name='customer_summary_top_idx'),
+        ]
+
+
+class ReportJob(models.Model):
+    """a report built in the background by the run_report_workers command, see order.report_jobs"""
+    kind = models.CharField(max_length=40, choices=REPORT_KINDS)
+    params = models.JSONField(default=dict)
+    # identical requests (same kind and params) share one job
+    params_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=REPORT_JOB_STATUSES, default="queued")
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="report_jobs")
+    # gzip compressed JSON body of the report
+    result = models.BinaryField(null=True, editable=False)
+    result_size = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Report job {self.pk} ({self.kind}, {self.status})"
+
+    class Meta:
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='reportjob_status_created_idx'),
+            models.Index(fields=['params_hash', '-created_at'], name='reportjob_params_hash_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['params_hash'],
+                condition=models.Q(status__in=ACTIVE_REPORT_JOB_STATUSES),
+                name='unique_active_report_job',
+            ),
+        ]
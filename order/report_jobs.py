@@ -0,0 +1,189 @@
+"""
+Reports built in the background. POST /orders/report-jobs/ queues a ReportJob row, the
+run_report_workers command claims queued rows with a conditional UPDATE (the database is the
+queue, no broker is needed), builds the report and stores the rendered JSON gzip compressed
+until REPORT_JOB_RESULT_TTL seconds later. Requests with the same kind and params share the
+queued, running or unexpired completed job instead of computing the report again.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.renderers import FastJSONRenderer
+
+from .enums import ACTIVE_REPORT_JOB_STATUSES
+from .models import ReportJob
+from .reports import (
+    build_frequent_purchased_product_report,
+    build_sales_report,
+    parse_frequent_report_params,
+    parse_sales_report_date,
+)
+
+REPORT_JOB_RESULT_TTL = getattr(settings, "REPORT_JOB_RESULT_TTL", 24 * 60 * 60)
+REPORT_JOB_TIMEOUT = getattr(settings, "REPORT_JOB_TIMEOUT", 30 * 60)
+REPORT_JOB_MAX_ATTEMPTS = getattr(settings, "REPORT_JOB_MAX_ATTEMPTS", 3)
+REPORT_JOB_POLL_INTERVAL = 2.0
+
+
+def _clean_sales_params(params, user):
+    try:
+        start_date = parse_sales_report_date(params["start_date"])
+        end_date = parse_sales_report_date(params["end_date"])
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError(
+            {"params": ["start_date and end_date are required in the format YYYY-MM-DDTHH:mm:ss.SSSSSSZ"]}
+        )
+    # normalized so that differently written identical ranges share a job
+    return {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+
+
+def _build_sales(params):
+    return build_sales_report(datetime.fromisoformat(params["start_date"]), datetime.fromisoformat(params["end_date"]))
+
+
+def _clean_frequent_purchased_products_params(params, user):
+    try:
+        top, start_day, end_day = parse_frequent_report_params(params)
+    except (TypeError, ValueError):
+        raise ValidationError(
+            {"params": ["top must be a positive number, start_date and end_date in the format YYYY-MM-DD"]}
+        )
+    # the report is about the requesting user, so users never share these jobs
+    return {
+        "owner": user.pk,
+        "top": top,
+        "start_date": start_day and start_day.isoformat(),
+        "end_date": end_day and end_day.isoformat(),
+    }
+
+
+def _build_frequent_purchased_products(params):
+    start_day, end_day = (date.fromisoformat(params[key]) if params.get(key) else None for key in ("start_date", "end_date"))
+    return build_frequent_purchased_product_report(params["owner"], params.get("top"), start_day, end_day)
+
+
+# kind: (role allowed to request it, params cleaner, builder)
+REPORTS = {
+    "sales": ("admin", _clean_sales_params, _build_sales),
+    "frequent_purchased_products": (
+        "regular_user",
+        _clean_frequent_purchased_products_params,
+        _build_frequent_purchased_products,
+    ),
+}
+
+
+def clean_report_params(kind, params, user):
+    """the canonical params of a report request, raises ValidationError when they are invalid"""
+    if not isinstance(params, dict):
+        raise ValidationError({"params": ["Expected an object"]})
+    return REPORTS[kind][1](params, user)
+
+
+def report_params_hash(kind, params):
+    canonical = json.dumps([kind, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _reusable_jobs(params_hash):
+    return ReportJob.objects.filter(params_hash=params_hash).filter(
+        Q(status__in=ACTIVE_REPORT_JOB_STATUSES) | Q(status="completed", expires_at__gt=timezone.now())
+    ).defer("result")
+
+
+def enqueue_report_job(kind, params, user):
+    """(job, created): the job building this report, a new queued one unless an identical request has one"""
+    params_hash = report_params_hash(kind, params)
+    job = _reusable_jobs(params_hash).order_by("-created_at").first()
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(kind=kind, params=params, params_hash=params_hash, requested_by=user), True
+    except IntegrityError:
+        # an identical request queued its job in between, unique_active_report_job keeps it the only one
+        job = _reusable_jobs(params_hash).order_by("-created_at").first()
+        if job is None:
+            raise
+        return job, False
+
+
+def requeue_stale_report_jobs(timeout=REPORT_JOB_TIMEOUT):
+    """put back jobs whose worker died while running them, fail those out of attempts"""
+    stale = ReportJob.objects.filter(status="running", started_at__lt=timezone.now() - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=REPORT_JOB_MAX_ATTEMPTS).update(
+        status="failed",
+        error="The report job timed out",
+        finished_at=timezone.now(),
+        expires_at=timezone.now() + timedelta(seconds=REPORT_JOB_RESULT_TTL),
+    )
+    requeued = stale.update(status="queued", worker="")
+    return requeued, failed
+
+
+def claim_report_job(worker):
+    """the oldest queued job, marked running for this worker, or None when the queue is empty"""
+    while True:
+        pk = ReportJob.objects.filter(status="queued").order_by("created_at", "id").values_list("pk", flat=True).first()
+        if pk is None:
+            return None
+        # only one worker flips the status, the others move on to the next job
+        claimed = ReportJob.objects.filter(pk=pk, status="queued").update(
+            status="running", worker=worker, started_at=timezone.now(), attempts=F("attempts") + 1
+        )
+        if claimed:
+            return ReportJob.objects.defer("result").get(pk=pk)
+
+
+def run_report_job(job):
+    """build the report of a claimed job and store it compressed, or the error it failed with"""
+    try:
+        content = FastJSONRenderer().render(REPORTS[job.kind][2](job.params))
+    except Exception as exc:  # noqa: BLE001 - recorded on the job for whoever polls it
+        values = {"status": "failed", "error": f"{type(exc).__name__}: {exc}"}
+    else:
+        values = {"status": "completed", "result": gzip.compress(content), "result_size": len(content), "error": ""}
+    finished_at = timezone.now()
+    # a job requeued as stale meanwhile belongs to its new worker
+    return ReportJob.objects.filter(pk=job.pk, status="running", worker=job.worker).update(
+        finished_at=finished_at, expires_at=finished_at + timedelta(seconds=REPORT_JOB_RESULT_TTL), **values
+    )
+
+
+def purge_expired_report_jobs():
+    """delete finished jobs whose result expired"""
+    deleted, _ = ReportJob.objects.filter(
+        status__in=["completed", "failed"], expires_at__lte=timezone.now()
+    ).delete()
+    return deleted
+
+
+def process_report_jobs(worker, stop=None, poll_interval=REPORT_JOB_POLL_INTERVAL, once=False):
+    """
+    Build queued jobs until stop is set, or until the queue is empty with once. Returns the
+    number of jobs this worker ran.
+    """
+    stop = stop or threading.Event()
+    processed = 0
+    requeue_stale_report_jobs()
+    while not stop.is_set():
+        job = claim_report_job(worker)
+        if job is not None:
+            run_report_job(job)
+            processed += 1
+            continue
+        if once:
+            break
+        purge_expired_report_jobs()
+        requeue_stale_report_jobs()
+        stop.wait(poll_interval)
+    return processed
@@ -0,0 +1,131 @@
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import F, Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import CustomerProductSummary, OrderItem
+from .rollups import raw_customer_products
+from .serializers import CustomerProductReportSerializer, OrderItemListSerializer
+
+SALES_REPORT_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+SALES_REPORT_STREAM_FORMATS = ("ndjson", "csv")
+SALES_REPORT_CHUNK_SIZE = 2000
+SALES_REPORT_COLUMNS = ["id", "quantity_required", "total_price", "product", "order"]
+
+
+def parse_sales_report_date(value):
+    return timezone.make_aware(datetime.strptime(value, SALES_REPORT_DATE_FORMAT))
+
+
+def sales_report_items(start_date, end_date):
+    return OrderItem.objects.filter(order__created_at__range=(start_date, end_date))
+
+
+def build_sales_report(start_date, end_date):
+    """every item ordered in the date range with the total sales amount"""
+    ordered_items = sales_report_items(start_date, end_date)
+    total_sales_amount = ordered_items.aggregate(total_sales_amount=Sum("total_price"))["total_sales_amount"]
+    return {
+        "data": OrderItemListSerializer(instance=ordered_items, many=True).data,
+        "total_sales_amount": round(total_sales_amount or Decimal("0.00"), 2),
+    }
+
+
+def parse_frequent_report_params(params):
+    """(top, start_day, end_day) of a frequent purchased product report, raises ValueError when invalid"""
+    top = params.get("top")
+    if top not in (None, ""):
+        top = int(top)
+        if top <= 0:
+            raise ValueError("top must be a positive number")
+    start_day, end_day = (date.fromisoformat(params[key]) if params.get(key) else None for key in ("start_date", "end_date"))
+    return top or None, start_day, end_day
+
+
+def frequent_purchased_products(owner, top=None, start_day=None, end_day=None):
+    """
+    a customer's purchases per product, most ordered quantity first. All time purchases are read
+    from the customer product summary, a date window is aggregated from the order items.
+    """
+    if start_day or end_day:
+        rows = raw_customer_products(owner, start_day, end_day)
+    else:
+        rows = CustomerProductSummary.objects.filter(owner=owner, item_count__gt=0)
+    rows = rows.values(
+        "product",
+        "last_purchased_at",
+        product_name=F("product__name"),
+        total_quantity_required=F("total_quantity"),
+        total_expenditure_on_product=F("total_spend"),
+    ).order_by("-total_quantity_required", "product")
+    return rows[:top] if top else rows
+
+
+def build_frequent_purchased_product_report(owner, top=None, start_day=None, end_day=None):
+    """the products a user ordered, most ordered quantity first"""
+    qs = frequent_purchased_products(owner, top, start_day, end_day)
+    serialized_data = CustomerProductReportSerializer(instance=qs, many=True).data
+    return {
+        "data": serialized_data,
+        "count": len(serialized_data),
+    }
+
+
+class Echo:
+    """file-like object that hands back whatever is written to it, used by csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+# renders prices like OrderItemListSerializer does, built once for every streamed row
+PRICE_FIELD = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+def _format_price(value):
+    return PRICE_FIELD.to_representation(value)
+
+
+def iter_sales_report_rows(queryset, chunk_size=SALES_REPORT_CHUNK_SIZE):
+    """yield (row, running_total) for every item in the queryset, fetched in chunks"""
+    total = Decimal("0.00")
+    rows = queryset.values_list(*SALES_REPORT_COLUMNS).order_by("id").iterator(chunk_size=chunk_size)
+    for row in rows:
+        total += row[2]
+        yield row, total
+
+
+def iter_sales_report_ndjson(queryset, chunk_size=SALES_REPORT_CHUNK_SIZE):
+    total = Decimal("0.00")
+    for row, total in iter_sales_report_rows(queryset, chunk_size):
+        item = dict(zip(SALES_REPORT_COLUMNS, row))
+        item["total_price"] = _format_price(item["total_price"])
+        yield json.dumps(item) + "\n"
+    yield json.dumps({"total_sales_amount": _format_price(total)}) + "\n"
+
+
+def iter_sales_report_csv(queryset, chunk_size=SALES_REPORT_CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SALES_REPORT_COLUMNS)
+    total = Decimal("0.00")
+    for row, total in iter_sales_report_rows(queryset, chunk_size):
+        row = list(row)
+        row[2] = _format_price(row[2])
+        yield writer.writerow(row)
+    yield writer.writerow(["total_sales_amount", _format_price(total)])
+
+
+def stream_sales_report(queryset, stream_format, chunk_size=SALES_REPORT_CHUNK_SIZE):
+    """stream the sales report as NDJSON or CSV with the total sales amount as the last line"""
+    if stream_format == "csv":
+        response = StreamingHttpResponse(iter_sales_report_csv(queryset, chunk_size), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="sales-report.csv"'
+        return response
+    return StreamingHttpResponse(
+        iter_sales_report_ndjson(queryset, chunk_size), content_type="application/x-ndjson"
+    )
@@ -0,0 +1,332 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import CustomerProductSummary, DailySalesRollup, Order, OrderItem
+
+ROLLUP_BATCH_SIZE = 1000
+# summaries whose last purchase is recomputed per UPDATE
+SUMMARY_REFRESH_BATCH_SIZE = 500
+DAILY_SALES_SOURCES = ("rollup", "raw")
+
+
+def order_day(order):
+    """the rollup day an order's items are counted on"""
+    return timezone.localdate(order.created_at or timezone.now())
+
+
+def _empty_delta():
+    return [0, Decimal("0.00"), 0]
+
+
+def collect_item_deltas(order, items, sign=1, status=None, deltas=None):
+    """accumulate rollup changes for order items into {(day, product_id, status): [qty, amount, count]}"""
+    deltas = defaultdict(_empty_delta) if deltas is None else deltas
+    key_status = status or order.status
+    day = order_day(order)
+    for item in items:
+        delta = deltas[(day, item.product_id, key_status)]
+        delta[0] += sign * (item.quantity_required or 0)
+        delta[1] += sign * Decimal(item.total_price)
+        delta[2] += sign
+    return deltas
+
+
+def _apply_rollup_deltas(deltas):
+    days = {day for day, _, _ in deltas}
+    product_ids = {product_id for _, product_id, _ in deltas}
+    statuses = {status for _, _, status in deltas}
+    existing = {
+        (rollup.day, rollup.product_id, rollup.status): rollup
+        for rollup in DailySalesRollup.objects.select_for_update().filter(
+            day__in=days, product_id__in=product_ids, status__in=statuses
+        )
+    }
+
+    changed, created = [], []
+    for key, (quantity, amount, count) in deltas.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            day, product_id, status = key
+            created.append(
+                DailySalesRollup(
+                    day=day,
+                    product_id=product_id,
+                    status=status,
+                    quantity_sold=quantity,
+                    total_sales_amount=amount,
+                    item_count=count,
+                )
+            )
+            continue
+        rollup.quantity_sold = F("quantity_sold") + quantity
+        rollup.total_sales_amount = F("total_sales_amount") + amount
+        rollup.item_count = F("item_count") + count
+        changed.append(rollup)
+
+    DailySalesRollup.objects.bulk_update(changed, ["quantity_sold", "total_sales_amount", "item_count"])
+    DailySalesRollup.objects.bulk_create(created)
+
+
+def apply_rollup_deltas(deltas):
+    """add the accumulated deltas onto the rollup rows with one read, one update and one insert"""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                _apply_rollup_deltas(deltas)
+        except IntegrityError:
+            # a concurrent request created some of the rows first, they exist now
+            _apply_rollup_deltas(deltas)
+
+
+def counts_as_purchase(status):
+    """cancelled orders are left out of the customer product summary"""
+    return status != "cancelled"
+
+
+def _empty_purchase_delta():
+    # quantity, amount, item count, latest purchase added, whether items were removed
+    return [0, Decimal("0.00"), 0, None, False]
+
+
+def collect_purchase_deltas(order, items, sign=1, deltas=None):
+    """accumulate customer product summary changes for order items into {(owner_id, product_id): delta}"""
+    deltas = defaultdict(_empty_purchase_delta) if deltas is None else deltas
+    purchased_at = order.created_at or timezone.now()
+    for item in items:
+        delta = deltas[(order.owner_id, item.product_id)]
+        delta[0] += sign * (item.quantity_required or 0)
+        delta[1] += sign * Decimal(item.total_price)
+        delta[2] += sign
+        if sign < 0:
+            delta[4] = True
+        elif delta[3] is None or purchased_at > delta[3]:
+            delta[3] = purchased_at
+    return deltas
+
+
+def _refresh_last_purchased(summary_ids):
+    """recompute last_purchased_at of the summaries that lost items, from the orders left"""
+    latest = (
+        Order.objects.filter(owner=OuterRef("owner"), orderitem__product=OuterRef("product"))
+        .exclude(status="cancelled")
+        .order_by("-created_at")
+        .values("created_at")[:1]
+    )
+    summary_ids = sorted(summary_ids)
+    for start in range(0, len(summary_ids), SUMMARY_REFRESH_BATCH_SIZE):
+        CustomerProductSummary.objects.filter(pk__in=summary_ids[start:start + SUMMARY_REFRESH_BATCH_SIZE]).update(
+            last_purchased_at=Subquery(latest)
+        )
+
+
+def _apply_purchase_deltas(deltas):
+    existing = {
+        (summary.owner_id, summary.product_id): summary
+        for summary in CustomerProductSummary.objects.select_for_update().filter(
+            owner_id__in={owner_id for owner_id, _ in deltas},
+            product_id__in={product_id for _, product_id in deltas},
+        )
+    }
+
+    changed, created = [], []
+    for key, (quantity, amount, count, purchased_at, _) in deltas.items():
+        summary = existing.get(key)
+        if summary is None:
+            owner_id, product_id = key
+            created.append(
+                CustomerProductSummary(
+                    owner_id=owner_id,
+                    product_id=product_id,
+                    total_quantity=quantity,
+                    total_spend=amount,
+                    item_count=count,
+                    last_purchased_at=purchased_at,
+                )
+            )
+            continue
+        summary.total_quantity = F("total_quantity") + quantity
+        summary.total_spend = F("total_spend") + amount
+        summary.item_count = F("item_count") + count
+        # the row is locked, so the latest purchase can be compared here
+        if purchased_at is not None and (summary.last_purchased_at is None or purchased_at > summary.last_purchased_at):
+            summary.last_purchased_at = purchased_at
+        changed.append(summary)
+
+    CustomerProductSummary.objects.bulk_update(
+        changed, ["total_quantity", "total_spend", "item_count", "last_purchased_at"]
+    )
+    CustomerProductSummary.objects.bulk_create(created)
+    removed = [existing[key].pk for key, delta in deltas.items() if delta[4] and key in existing]
+    if removed:
+        _refresh_last_purchased(removed)
+
+
+def apply_purchase_deltas(deltas):
+    """add the accumulated deltas onto the customer product summaries, like apply_rollup_deltas"""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta[:3]) or delta[4]}
+    if not deltas:
+        return
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                _apply_purchase_deltas(deltas)
+        except IntegrityError:
+            # a concurrent request created some of the rows first, they exist now
+            _apply_purchase_deltas(deltas)
+
+
+def record_order_items(order, items, sign=1):
+    """
+    add (sign=1) or remove (sign=-1) order items from the rollup and the customer product summary,
+    removals are recorded once the items are gone so the last purchase can be recomputed
+    """
+    apply_rollup_deltas(collect_item_deltas(order, items, sign))
+    if counts_as_purchase(order.status):
+        apply_purchase_deltas(collect_purchase_deltas(order, items, sign))
+
+
+def collect_status_deltas(order, old_status, new_status, items, deltas=None, purchases=None):
+    """accumulate the rollup and customer product summary changes of a status change, returns (deltas, purchases)"""
+    deltas = collect_item_deltas(order, items, sign=-1, status=old_status, deltas=deltas)
+    collect_item_deltas(order, items, sign=1, status=new_status, deltas=deltas)
+    purchases = defaultdict(_empty_purchase_delta) if purchases is None else purchases
+    if counts_as_purchase(old_status) != counts_as_purchase(new_status):
+        collect_purchase_deltas(order, items, 1 if counts_as_purchase(new_status) else -1, deltas=purchases)
+    return deltas, purchases
+
+
+def move_order_status(order, old_status, new_status, items=None):
+    """move an order's items from the old status bucket to the new one"""
+    if old_status == new_status:
+        return
+    if items is None:
+        items = list(OrderItem.objects.filter(order=order).only("product_id", "quantity_required", "total_price"))
+    deltas, purchases = collect_status_deltas(order, old_status, new_status, items)
+    apply_rollup_deltas(deltas)
+    apply_purchase_deltas(purchases)
+
+
+def raw_daily_sales(start_day=None, end_day=None):
+    """the rollup rows computed straight from OrderItem, used for rebuilds and verification"""
+    items = OrderItem.objects.all()
+    if start_day:
+        items = items.filter(order__created_at__date__gte=start_day)
+    if end_day:
+        items = items.filter(order__created_at__date__lte=end_day)
+    return (
+        items.annotate(day=TruncDate("order__created_at"), status=F("order__status"))
+        .values("day", "product", "status")
+        .annotate(
+            quantity_sold=Sum("quantity_required"),
+            total_sales_amount=Sum("total_price"),
+            item_count=Count("id"),
+        )
+        .order_by("day", "product", "status")
+    )
+
+
+def rollup_daily_sales(start_day=None, end_day=None):
+    """the rollup rows for a day range, in the same shape as raw_daily_sales"""
+    rollups = DailySalesRollup.objects.filter(item_count__gt=0)
+    if start_day:
+        rollups = rollups.filter(day__gte=start_day)
+    if end_day:
+        rollups = rollups.filter(day__lte=end_day)
+    return rollups.values("day", "product", "status", "quantity_sold", "total_sales_amount", "item_count")
+
+
+def rebuild_rollups(start_day=None, end_day=None, batch_size=ROLLUP_BATCH_SIZE):
+    """recompute the rollup rows for a day range from OrderItem, returns the number of rows written"""
+    written = 0
+    with transaction.atomic():
+        stale = DailySalesRollup.objects.all()
+        if start_day:
+            stale = stale.filter(day__gte=start_day)
+        if end_day:
+            stale = stale.filter(day__lte=end_day)
+        stale.delete()
+
+        batch = []
+        for row in raw_daily_sales(start_day, end_day).iterator(chunk_size=batch_size):
+            batch.append(
+                DailySalesRollup(
+                    day=row["day"],
+                    product_id=row["product"],
+                    status=row["status"],
+                    quantity_sold=row["quantity_sold"] or 0,
+                    total_sales_amount=row["total_sales_amount"] or Decimal("0.00"),
+                    item_count=row["item_count"],
+                )
+            )
+            if len(batch) >= batch_size:
+                DailySalesRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        DailySalesRollup.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def raw_customer_products(owner, start_day=None, end_day=None):
+    """a customer's purchases per product computed straight from OrderItem, in the summary's shape"""
+    items = OrderItem.objects.filter(order__owner=owner).exclude(order__status="cancelled")
+    if start_day:
+        items = items.filter(order__created_at__date__gte=start_day)
+    if end_day:
+        items = items.filter(order__created_at__date__lte=end_day)
+    return items.values("product").annotate(
+        total_quantity=Sum("quantity_required"),
+        total_spend=Sum("total_price"),
+        item_count=Count("id"),
+        last_purchased_at=Max("order__created_at"),
+    )
+
+
+def rebuild_customer_summaries(owner=None, batch_size=ROLLUP_BATCH_SIZE):
+    """recompute the customer product summaries (of one owner) from OrderItem, returns the rows written"""
+    written = 0
+    with transaction.atomic():
+        summaries = CustomerProductSummary.objects.all()
+        items = OrderItem.objects.exclude(order__status="cancelled")
+        if owner is not None:
+            summaries = summaries.filter(owner=owner)
+            items = items.filter(order__owner=owner)
+        summaries.delete()
+
+        rows = (
+            items.values("order__owner", "product")
+            .annotate(
+                total_quantity=Sum("quantity_required"),
+                total_spend=Sum("total_price"),
+                item_count=Count("id"),
+                last_purchased_at=Max("order__created_at"),
+            )
+            .order_by("order__owner", "product")
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(
+                CustomerProductSummary(
+                    owner_id=row["order__owner"],
+                    product_id=row["product"],
+                    total_quantity=row["total_quantity"] or 0,
+                    total_spend=row["total_spend"] or Decimal("0.00"),
+                    item_count=row["item_count"],
+                    last_purchased_at=row["last_purchased_at"],
+                )
+            )
+            if len(batch) >= batch_size:
+                CustomerProductSummary.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        CustomerProductSummary.objects.bulk_create(batch)
+        written += len(batch)
+    return written
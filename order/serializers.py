@@ -1,7 +1,13 @@
 from rest_framework import serializers
-from .models import Order,OrderItem
+from rest_framework.settings import api_settings
+from core.values import ValuesSerializer
+from .models import Order,OrderItem,ReportJob
 from product.models import Product
+from product.cache import get_cached_products
 from decimal import Decimal
+from django.db import transaction
+from .enums import ORDER_STATUSES
+from .services import BULK_TRANSITION_MAX_ORDERS, item_quantities, place_orders
 
 class OrderItemListSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,21 +16,14 @@ class OrderItemListSerializer(serializers.ModelSerializer):
 
 
 class CustomerProductReportSerializer(serializers.Serializer):
-    product = serializers.StringRelatedField()
-    product_name = serializers.CharField(source='product.name', read_only=True)
+    """flat rows of order.reports.frequent_purchased_products, product columns are read in the same query"""
+    product = serializers.IntegerField(read_only=True)
+    product_name = serializers.CharField(read_only=True)
+    total_quantity_required = serializers.IntegerField(read_only=True)
     total_expenditure_on_product = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True
+        max_digits=14, decimal_places=2, read_only=True
     )
-    total_quantity_required = serializers.IntegerField(read_only=True)
-
-    class Meta:
-        model = OrderItem
-        fields = [
-            'product',
-            'product_name',
-            'total_quantity_required',
-            'total_expenditure_on_product',
-        ]
+    last_purchased_at = serializers.DateTimeField(read_only=True)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -33,6 +32,15 @@ class CustomerProductReportSerializer(serializers.Serializer):
         return representation
 
 
+class DailySalesReportSerializer(serializers.Serializer):
+    day = serializers.DateField(read_only=True)
+    product = serializers.IntegerField(read_only=True)
+    status = serializers.CharField(read_only=True)
+    quantity_sold = serializers.IntegerField(read_only=True)
+    total_sales_amount = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+
+
 class OrderDetailSerializer(serializers.ModelSerializer):
     owner = serializers.StringRelatedField(source="owner.fullname")
     items =OrderItemListSerializer(many=True,source="orderitem_set")
@@ -41,11 +49,77 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         model=Order
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """order without its items, which are summarized by item_count and total_amount"""
+    owner = serializers.StringRelatedField(source="owner.fullname")
+    class Meta:
+        fields = "__all__"
+        model = Order
+
+
+OWNER_FULLNAME = (("owner__firstname", "owner__lastname"), lambda firstname, lastname: f"{firstname} {lastname}")
+
+
+class OrderValuesSerializer(ValuesSerializer):
+    serializer_class = OrderDetailSerializer
+    computed = {"owner": OWNER_FULLNAME}
+
+
+class OrderSummaryValuesSerializer(ValuesSerializer):
+    serializer_class = OrderSummarySerializer
+    computed = {"owner": OWNER_FULLNAME}
+
+
+class ProductPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """product field resolved through the product cache, or from the products prefetched by the list serializer"""
+
+    def to_internal_value(self, data):
+        products = getattr(self.parent, "prefetched_products", None)
+        try:
+            if products is None:
+                products = get_cached_products([int(data)])
+            return products[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class OrderItemCreateListSerializer(serializers.ListSerializer):
+    """fetches every product of the order from the product cache (one query for misses) before validating the items"""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+
+        product_ids = [item.get("product") for item in data if isinstance(item, dict) and item.get("product") is not None]
+        valid_ids = {int(pk) for pk in product_ids if str(pk).isdigit()}
+        products = get_cached_products(valid_ids)
+
+        invalid_ids = [str(pk) for pk in product_ids if not str(pk).isdigit() or int(pk) not in products]
+        if invalid_ids:
+            raise serializers.ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        f"Invalid product id(s): {', '.join(dict.fromkeys(invalid_ids))}"
+                    ]
+                }
+            )
+
+        self.child.prefetched_products = products
+        try:
+            return super().to_internal_value(data)
+        finally:
+            del self.child.prefetched_products
+
+
 class OrderItemCreateSerializer(serializers.ModelSerializer):
+    product = ProductPrimaryKeyField(queryset=Product.objects.all())
 
     class Meta:
         fields = ["product", "quantity_required"]
         model = OrderItem
+        list_serializer_class = OrderItemCreateListSerializer
 
     def validate(self, attrs):
         quantity_required = attrs["quantity_required"]
@@ -68,7 +142,43 @@ class OrderCreationSerializer(serializers.Serializer):
 
     def save(self, **kwargs):
         kwargs["owner"] = self.validated_data["owner"]
-        order = Order.objects.create(**kwargs)
-        ordered_items = [OrderItem(**item,order=order)  for item in self.validated_data["items"]]
-        OrderItem.objects.bulk_create(ordered_items)
+        ordered_items = [OrderItem(**item)  for item in self.validated_data["items"]]
+        with transaction.atomic():
+            Product.objects.reserve_stock(item_quantities(ordered_items))
+            order, = place_orders([(Order(**kwargs), ordered_items)])
         return order
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    params = serializers.DictField(required=False, default=dict)
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            "id",
+            "kind",
+            "params",
+            "status",
+            "error",
+            "attempts",
+            "result_size",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "expires_at",
+        ]
+        read_only_fields = [field for field in fields if field not in ("kind", "params")]
+
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    """the target status and the orders to move, given as ids or as OrderFilter parameters"""
+    status = serializers.ChoiceField(choices=ORDER_STATUSES)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=BULK_TRANSITION_MAX_ORDERS
+    )
+    filter = serializers.DictField(required=False, allow_empty=False)
+
+    def validate(self, attrs):
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("Give either ids or filter")
+        return attrs
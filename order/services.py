@@ -0,0 +1,302 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from core.counts import invalidate_counts
+from product.models import Product
+
+from .enums import ORDER_STATUS_SOURCES
+from .models import Order, OrderItem
+from .rollups import (
+    apply_purchase_deltas,
+    apply_rollup_deltas,
+    collect_item_deltas,
+    collect_purchase_deltas,
+    collect_status_deltas,
+    counts_as_purchase,
+    move_order_status,
+    record_order_items,
+)
+
+ORDER_TOTALS_BATCH_SIZE = 1000
+ORDER_TRANSITION_BATCH_SIZE = 500
+# orders one bulk transition request may move
+BULK_TRANSITION_MAX_ORDERS = 10000
+
+
+class StatusChanged(APIException):
+    """raised when locked orders no longer have the status they were read with"""
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Orders changed status while they were being transitioned."
+    default_code = "status_changed"
+
+
+class StatusConflict(APIException):
+    """raised when the stored status of an order does not allow the requested one"""
+
+    status_code = status.HTTP_409_CONFLICT
+    default_code = "status_conflict"
+
+    def __init__(self, order_id, current_status, new_status):
+        self.current_status = current_status
+        super().__init__(f"Order {order_id} is {current_status} and cannot be set to {new_status}")
+
+
+def item_quantities(items):
+    """total quantity required per product id"""
+    quantities = Counter()
+    for item in items:
+        quantities[item.product_id] += item.quantity_required or 0
+    return quantities
+
+
+def holds_stock(status):
+    """cancelled orders give their stock back, every other status keeps it reserved"""
+    return status != "cancelled"
+
+
+def place_orders(orders_with_items, batch_size=None):
+    """
+    Insert [(order, items)] with one bulk insert per table, setting the order totals, and record
+    them in the daily rollup and the customer product summary. Stock has to be reserved by the caller, in the same transaction.
+    """
+    for order, items in orders_with_items:
+        order.item_count = len(items)
+        order.total_amount = sum((item.total_price for item in items), Decimal("0.00"))
+    with transaction.atomic():
+        orders = Order.objects.bulk_create([order for order, _ in orders_with_items], batch_size=batch_size)
+        all_items = []
+        deltas = None
+        purchases = None
+        for order, items in orders_with_items:
+            for item in items:
+                item.order = order
+            all_items.extend(items)
+            deltas = collect_item_deltas(order, items, deltas=deltas)
+            if counts_as_purchase(order.status):
+                purchases = collect_purchase_deltas(order, items, deltas=purchases)
+        OrderItem.objects.bulk_create(all_items, batch_size=batch_size)
+        if deltas:
+            apply_rollup_deltas(deltas)
+        if purchases:
+            apply_purchase_deltas(purchases)
+    invalidate_counts(Order, OrderItem)
+    return orders
+
+
+def set_order_status(order, new_status):
+    """
+    Change the order status with an UPDATE of the status column guarded by the statuses
+    ORDER_STATUS_SOURCES allows, then release or re-reserve its stock and move its rollup rows.
+    The stored status decides, so a concurrent transition is never overwritten: StatusConflict is
+    raised when it does not allow new_status.
+    """
+    # the status read with the order is tried first, other sources only matter if it changed since
+    sources = sorted(ORDER_STATUS_SOURCES[new_status], key=lambda source: source != order.status)
+    with transaction.atomic():
+        now = timezone.now()
+        previous_status = next(
+            (
+                source
+                for source in sources
+                if Order.objects.filter(pk=order.pk, status=source).update(status=new_status, updated_at=now)
+            ),
+            None,
+        )
+        if previous_status is None:
+            current_status = Order.objects.filter(pk=order.pk).values_list("status", flat=True).first()
+            if current_status is None:
+                raise NotFound()
+            raise StatusConflict(order.pk, current_status, new_status)
+
+        items = list(OrderItem.objects.filter(order=order).only("product_id", "quantity_required", "total_price"))
+        if holds_stock(previous_status) and not holds_stock(new_status):
+            Product.objects.release_stock(item_quantities(items))
+        elif not holds_stock(previous_status) and holds_stock(new_status):
+            Product.objects.reserve_stock(item_quantities(items), reason="order_restored")
+        move_order_status(order, previous_status, new_status, items)
+    # the UPDATE bypasses post_save, so the cached counts are dropped here
+    invalidate_counts(Order)
+    order.status = new_status
+    order.updated_at = now
+    return order
+
+
+def _restorable_orders(orders, items):
+    """the orders whose stock can be reserved again, in id order, and the quantities they take"""
+    needed = Counter()
+    for order in orders:
+        needed.update(item_quantities(items[order.pk]))
+    available = Counter({pk: quantity or 0 for pk, quantity in Product.objects.lock_stock(needed).items()})
+
+    accepted, reserved = [], Counter()
+    for order in sorted(orders, key=lambda order: order.pk):
+        quantities = item_quantities(items[order.pk])
+        if all(reserved[pk] + quantity <= available[pk] for pk, quantity in quantities.items()):
+            reserved.update(quantities)
+            accepted.append(order)
+    return accepted, reserved
+
+
+def _transition_batch(order_ids, new_status):
+    """move one batch of orders to new_status in a transaction, returns the ids that moved"""
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status__in=ORDER_STATUS_SOURCES[new_status])
+            .only("id", "owner_id", "status", "created_at")
+        )
+        items = defaultdict(list)
+        for item in OrderItem.objects.filter(order__in=orders).only(
+            "order_id", "product_id", "quantity_required", "total_price"
+        ):
+            items[item.order_id].append(item)
+
+        if holds_stock(new_status):
+            restored, reserved = _restorable_orders([order for order in orders if not holds_stock(order.status)], items)
+            orders = [order for order in orders if holds_stock(order.status)] + restored
+        else:
+            reserved = Counter()
+
+        sources = defaultdict(list)
+        for order in orders:
+            sources[order.status].append(order.pk)
+        now = timezone.now()
+        for source, ids in sources.items():
+            # one UPDATE per source status, guarded by it, the rows are locked so a mismatch means the lock did not hold
+            moved = Order.objects.filter(pk__in=ids, status=source).update(status=new_status, updated_at=now)
+            if moved != len(ids):
+                raise StatusChanged(f"{len(ids) - moved} orders left status {source} meanwhile")
+
+        released = Counter()
+        deltas = purchases = None
+        for order in orders:
+            if holds_stock(order.status) and not holds_stock(new_status):
+                released.update(item_quantities(items[order.pk]))
+            deltas, purchases = collect_status_deltas(
+                order, order.status, new_status, items[order.pk], deltas=deltas, purchases=purchases
+            )
+        Product.objects.release_stock(released)
+        Product.objects.reserve_stock(reserved, reason="order_restored")
+        if orders:
+            apply_rollup_deltas(deltas)
+            apply_purchase_deltas(purchases)
+    return {order.pk for order in orders}
+
+
+def transition_orders(order_ids, new_status, batch_size=ORDER_TRANSITION_BATCH_SIZE):
+    """
+    Move many orders to new_status, batch_size orders per transaction. The orders of a batch are
+    grouped by their current status and each group is moved with one conditional UPDATE, their
+    stock, rollup rows and customer product summaries change in the same transaction.
+    Returns (transitioned ids, rejected ids), orders are rejected when they do not exist, their
+    status cannot move to new_status (see ORDER_STATUS_TRANSITIONS), or their stock cannot be
+    reserved again. StatusChanged aborts the batch it happens in, earlier batches stay committed.
+    """
+    order_ids = sorted(set(order_ids))
+    transitioned = set()
+    for start in range(0, len(order_ids), batch_size):
+        transitioned |= _transition_batch(order_ids[start:start + batch_size], new_status)
+    if transitioned:
+        invalidate_counts(Order)
+    return sorted(transitioned), [pk for pk in order_ids if pk not in transitioned]
+
+
+def delete_order(order):
+    """delete the order, giving back the stock of orders that were never fulfilled"""
+    with transaction.atomic():
+        items = list(order.orderitem_set.all())
+        if order.status == "pending":
+            Product.objects.release_stock(item_quantities(items), reason="order_deleted")
+        order.delete()
+        record_order_items(order, items, sign=-1)
+
+
+def modify_order_item(order_item, order, product, quantity_required, total_price):
+    """replace the product and quantity of an item, moving stock and rollup rows accordingly"""
+    with transaction.atomic():
+        stock_changes = Counter()
+        if holds_stock(order_item.order.status):
+            stock_changes[order_item.product_id] += order_item.quantity_required or 0
+        if holds_stock(order.status):
+            stock_changes[product.id] -= quantity_required
+        Product.objects.adjust_stock(stock_changes, reason="order_modified")
+
+        previous_item = OrderItem(
+            product_id=order_item.product_id,
+            quantity_required=order_item.quantity_required,
+            total_price=order_item.total_price,
+        )
+        previous_order = order_item.order
+        totals = defaultdict(lambda: [0, Decimal("0.00")])
+        totals[order_item.order_id][0] -= 1
+        totals[order_item.order_id][1] -= order_item.total_price
+        totals[order.pk][0] += 1
+        totals[order.pk][1] += total_price
+
+        order_item.order = order
+        order_item.product = product
+        order_item.quantity_required = quantity_required
+        order_item.total_price = total_price
+        order_item.save()
+        record_order_items(previous_order, [previous_item], sign=-1)
+        record_order_items(order, [order_item])
+        # items have no timestamp of their own, their orders carry the change
+        now = timezone.now()
+        for order_id, (item_count, total_amount) in totals.items():
+            Order.objects.filter(pk=order_id).update(
+                item_count=F("item_count") + item_count,
+                total_amount=F("total_amount") + total_amount,
+                updated_at=now,
+            )
+    invalidate_counts(Order)
+    return order_item
+
+
+def recompute_order_totals(batch_size=ORDER_TOTALS_BATCH_SIZE, fix=True, stdout=None):
+    """
+    Compare the stored item_count and total_amount of every order with its items, batch_size
+    orders at a time, and rewrite the ones that drifted unless fix is False.
+    Returns (orders checked, orders that did not match).
+    """
+    checked = mismatched = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Order.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .with_computed_totals()
+            .only("id", "item_count", "total_amount")[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        checked += len(batch)
+        drifted = [
+            order
+            for order in batch
+            if (order.item_count, order.total_amount) != (order.computed_item_count, order.computed_total_amount)
+        ]
+        mismatched += len(drifted)
+        if stdout is not None:
+            for order in drifted:
+                stdout.write(
+                    f"order {order.pk}: stored {order.item_count} items / {order.total_amount}, "
+                    f"items say {order.computed_item_count} / {order.computed_total_amount}"
+                )
+        if fix and drifted:
+            now = timezone.now()
+            for order in drifted:
+                order.item_count = order.computed_item_count
+                order.total_amount = order.computed_total_amount
+                order.updated_at = now
+            Order.objects.bulk_update(drifted, ["item_count", "total_amount", "updated_at"])
+    if fix and mismatched:
+        invalidate_counts(Order)
+    return checked, mismatched
@@ -1,8 +1,19 @@
+import json
 import pytest
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from django.apps import apps as django_apps
+from django.core.management import CommandError, call_command
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from django.db.models import Prefetch, Sum
 from user.test.factories import UserFactory
 from product.test.factories import ProductFactory
+from product.models import Product
 from order.test.factories import OrderFactory, OrderItemFactory
 
 
@@ -18,16 +29,28 @@ COMPLETE_ORDER_URL= "order:order-complete-order"
 SET_PENDING_URL="order:order-set-pending"
 MODIFY_ITEM_URL ="order:order-modify-item"
 GENERATE_SALES_REPORT_URL="order:order-generate-sales-report"
-from order.models import Order,OrderItem
+DAILY_SALES_REPORT_URL = "order:order-generate-daily-sales-report"
+BULK_IMPORT_URL = "order:order-bulk-import-orders"
+BULK_TRANSITION_URL = "order:order-bulk-transition"
+FREQUENT_REPORT_URL = "order:order-generate-frequent-purchased-product"
+REPORT_JOB_LIST_URL = "order:report-job-list"
+REPORT_JOB_DETAIL_URL = "order:report-job-detail"
+REPORT_JOB_RESULT_URL = "order:report-job-result"
+from order.models import Order,OrderItem,DailySalesRollup,CustomerProductSummary
+from order.serializers import OrderDetailSerializer, OrderSummarySerializer
+from order.services import ORDER_TRANSITION_BATCH_SIZE, StatusConflict, place_orders, set_order_status
+from order.models import ReportJob
+from order.rollups import apply_purchase_deltas, collect_purchase_deltas, raw_daily_sales, rollup_daily_sales
+from order.report_jobs import claim_report_job, process_report_jobs, requeue_stale_report_jobs
 
 
 class TestOrderEndpoints:
 
     def test_create_order(self, api_client, mocked_authentication):
         initiator = UserFactory(role='admin')
-        product1 = ProductFactory(created_by=initiator)
-        product2 = ProductFactory(created_by=initiator)
-        product3 = ProductFactory(created_by=initiator)
+        product1 = ProductFactory(created_by=initiator, quantity=10)
+        product2 = ProductFactory(created_by=initiator, quantity=10)
+        product3 = ProductFactory(created_by=initiator, quantity=10)
         regular_user = UserFactory(role='regular_user')
 
         payload = {
@@ -45,7 +68,189 @@ class TestOrderEndpoints:
         url = reverse(CREATE_ORDER_URL)
         response = api_client.post(url, data=payload, format="json")
         assert response.status_code == 201
-        
+        product1.refresh_from_db()
+        assert product1.quantity == 6
+
+    def test_create_large_order_uses_constant_queries(self, api_client, mocked_authentication, django_assert_max_num_queries):
+        initiator = UserFactory(role='admin')
+        products = ProductFactory.create_batch(200, created_by=initiator, quantity=10)
+        regular_user = UserFactory(role='regular_user')
+        payload = {"items": [{"product": product.id, "quantity_required": 2} for product in products]}
+
+        mocked_authentication(active_user=regular_user)
+        # stock and its ledger, order, items, daily rollup and customer product summary, independent of the item count
+        with django_assert_max_num_queries(27):
+            response = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json")
+
+        assert response.status_code == 201
+        assert OrderItem.objects.count() == 200
+
+    def test_deny_order_creation_with_invalid_products(self, api_client, mocked_authentication):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, quantity=10)
+        regular_user = UserFactory(role='regular_user')
+        payload = {
+            "items": [
+                {"product": product1.id, "quantity_required": 1},
+                {"product": 99998, "quantity_required": 1},
+                {"product": 99999, "quantity_required": 1},
+            ]
+        }
+
+        mocked_authentication(active_user=regular_user)
+        response = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json")
+
+        assert response.status_code == 400
+        assert response.json()["items"]["errors"] == ["Invalid product id(s): 99998, 99999"]
+
+    def test_deny_order_creation_with_insufficient_stock(self, api_client, mocked_authentication):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, quantity=10)
+        product2 = ProductFactory(created_by=initiator, quantity=3)
+        regular_user = UserFactory(role='regular_user')
+        payload = {"items": [{"product": product1.id, "quantity_required": 4}, {"product": product2.id, "quantity_required": 5}]}
+
+        mocked_authentication(active_user=regular_user)
+        response = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json")
+
+        assert response.status_code == 400
+        assert Order.objects.count() == 0
+        product1.refresh_from_db()
+        assert product1.quantity == 10
+
+    def test_cancel_and_restore_order_moves_stock(self, api_client, mocked_authentication_with_role):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, quantity=5)
+        regular_user = UserFactory(role='regular_user')
+        payload = {"items": [{"product": product1.id, "quantity_required": 2}, {"product": product1.id, "quantity_required": 3}]}
+
+        mocked_authentication_with_role(active_user=regular_user, role='regular_user')
+        order_id = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").data["id"]
+        product1.refresh_from_db()
+        assert product1.quantity == 0
+
+        mocked_authentication_with_role(active_user=regular_user, role='admin')
+        api_client.post(reverse(CANCEL_ORDER_URL, kwargs={'pk': order_id}))
+        product1.refresh_from_db()
+        assert product1.quantity == 5
+
+        api_client.post(reverse(SET_PENDING_URL, kwargs={'pk': order_id}))
+        product1.refresh_from_db()
+        assert product1.quantity == 0
+
+    def test_bulk_transition_moves_orders_and_stock(self, api_client, mocked_authentication_with_role):
+        """one request moves many orders, unknown, unchanged and out of stock orders are rejected"""
+        admin = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=admin, quantity=10)
+        regular_user = UserFactory(role='regular_user')
+        mocked_authentication_with_role(active_user=regular_user, role='regular_user')
+        payload = {"items": [{"product": product1.id, "quantity_required": 2}]}
+        order_ids = [api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").data["id"] for _ in range(3)]
+        url = reverse(BULK_TRANSITION_URL)
+
+        mocked_authentication_with_role(active_user=admin, role='admin')
+        response = api_client.post(url, {"status": "cancelled", "ids": [*order_ids[:2], 99999]}, format="json")
+        assert response.status_code == 200
+        assert response.data == {"status": "cancelled", "transitioned": order_ids[:2], "rejected": [99999]}
+        product1.refresh_from_db()
+        assert product1.quantity == 8
+        assert api_client.post(url, {"status": "cancelled", "ids": order_ids[:1]}, format="json").data["rejected"] == order_ids[:1]
+
+        Product.objects.reserve_stock({product1.id: 5})
+        response = api_client.post(url, {"status": "pending", "ids": order_ids[:2]}, format="json")
+        # only the first order fits in the 3 left
+        assert (response.data["transitioned"], response.data["rejected"]) == (order_ids[:1], order_ids[1:2])
+        product1.refresh_from_db()
+        assert product1.quantity == 1
+
+        response = api_client.post(url, {"status": "completed", "filter": {"status": "pending"}}, format="json")
+        assert response.data["transitioned"] == [order_ids[0], order_ids[2]]
+        assert list(Order.objects.order_by("id").values_list("status", flat=True)) == ["completed", "cancelled", "completed"]
+        summary = CustomerProductSummary.objects.get(owner=regular_user, product=product1)
+        assert (summary.total_quantity, summary.item_count) == (4, 2)
+        assert dict(DailySalesRollup.objects.filter(item_count__gt=0).values_list("status", "item_count")) == {
+            "completed": 2, "cancelled": 1
+        }
+
+        assert api_client.post(url, {"status": "completed", "ids": [1], "filter": {"status": "pending"}}, format="json").status_code == 400
+        assert api_client.post(url, {"status": "completed", "filter": {"colour": "red"}}, format="json").status_code == 400
+        mocked_authentication_with_role(active_user=regular_user, role='regular_user')
+        assert api_client.post(url, {"status": "completed", "ids": order_ids}, format="json").status_code == 403
+
+    def test_status_change_refreshes_filtered_counts_and_etags(self, api_client, mocked_authentication_with_role):
+        """single order transitions drop the cached counts and list validators they change"""
+        admin = UserFactory(role='admin')
+        customer = UserFactory(role='regular_user')
+        orders = OrderFactory.create_batch(2, owner=customer, status='pending')
+        mocked_authentication_with_role(active_user=admin, role='admin')
+        url = reverse(ORDER_LIST_URL)
+        response = api_client.get(url, {"status": "pending"})
+        assert response.json()["total"] == 2
+
+        for action_url, order, remaining in ((COMPLETE_ORDER_URL, orders[0], 1), (CANCEL_ORDER_URL, orders[1], 0)):
+            etag = response["ETag"]
+            assert api_client.post(reverse(action_url, kwargs={'pk': order.id})).status_code == 200
+
+            response = api_client.get(url, {"status": "pending"}, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 200
+            assert response["ETag"] != etag
+            assert response.json()["total"] == len(response.json()["results"]) == remaining
+
+    def test_bulk_transition_default_batch_of_multi_item_orders(self, api_client, mocked_authentication_with_role):
+        """a full default batch of orders with several items each moves in one request"""
+        admin = UserFactory(role='admin')
+        customers = UserFactory.create_batch(4, role='regular_user')
+        products = Product.objects.bulk_create(
+            [Product(name=f"product {index}", price=1, quantity=10, created_by=admin) for index in range(3 * ORDER_TRANSITION_BATCH_SIZE)]
+        )
+        orders = place_orders(
+            [
+                (
+                    Order(owner=customers[index % 4]),
+                    [OrderItem(product=products[3 * index + offset], quantity_required=1, total_price=Decimal("1.00")) for offset in range(3)],
+                )
+                for index in range(ORDER_TRANSITION_BATCH_SIZE)
+            ]
+        )
+        order_ids = sorted(order.pk for order in orders)
+        mocked_authentication_with_role(active_user=admin, role='admin')
+
+        response = api_client.post(reverse(BULK_TRANSITION_URL), {"status": "cancelled", "ids": order_ids}, format="json")
+
+        assert response.status_code == 200
+        assert (response.data["transitioned"], response.data["rejected"]) == (order_ids, [])
+        assert set(Product.objects.values_list("quantity", flat=True)) == {11}
+        assert not CustomerProductSummary.objects.exclude(item_count=0, last_purchased_at__isnull=True).exists()
+        assert DailySalesRollup.objects.filter(status="cancelled").aggregate(items=Sum("item_count"))["items"] == 3 * ORDER_TRANSITION_BATCH_SIZE
+
+    def test_status_transitions_are_guarded(self, api_client, mocked_authentication_with_role):
+        """transitions the table does not allow are answered with 409, the stored status decides"""
+        admin = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=admin, quantity=10)
+        order = OrderFactory(owner=UserFactory(role='regular_user'), status='pending')
+        OrderItemFactory(product=product1, order=order, quantity_required=2)
+        mocked_authentication_with_role(active_user=admin, role='admin')
+
+        assert api_client.post(reverse(COMPLETE_ORDER_URL, kwargs={'pk': order.id})).status_code == 200
+        response = api_client.post(reverse(CANCEL_ORDER_URL, kwargs={'pk': order.id}))
+        assert response.status_code == 409
+        assert "is completed" in response.data["detail"]
+        assert api_client.post(reverse(SET_PENDING_URL, kwargs={'pk': order.id})).status_code == 409
+        order.refresh_from_db()
+        assert order.status == 'completed'
+
+        # a copy read before a concurrent cancellation moves from the stored status, not its own
+        stale = Order.objects.create(owner=order.owner, status='pending')
+        OrderItemFactory(product=product1, order=stale, quantity_required=3)
+        Order.objects.filter(pk=stale.pk).update(status='cancelled')
+        with pytest.raises(StatusConflict):
+            set_order_status(stale, 'cancelled')
+        set_order_status(stale, 'pending')
+        product1.refresh_from_db()
+        assert product1.quantity == 7
+        response = api_client.post(reverse(BULK_TRANSITION_URL), {"status": "pending", "ids": [order.id]}, format="json")
+        assert response.data["rejected"] == [order.id]
+
     def test_deny_unathenticated_user_order_creation(self, api_client):
         initiator = UserFactory(role='admin')
         product1 = ProductFactory(created_by=initiator)
@@ -91,6 +296,43 @@ class TestOrderEndpoints:
         assert Order.objects.count() == 3
         assert response.json()["total"] == 2
 
+    def test_search_orders_by_product_returns_each_order_once(self, mocked_authentication, api_client):
+        initiator = UserFactory(role='admin')
+        chair = ProductFactory(created_by=initiator, name="red chair", description="wooden")
+        table = ProductFactory(created_by=initiator, name="table", description="red oak")
+        lamp = ProductFactory(created_by=initiator, name="lamp", description="brass")
+        regular_user1 = UserFactory(role='regular_user')
+        order1 = OrderFactory(owner=regular_user1)
+        order2 = OrderFactory(owner=regular_user1)
+        OrderFactory(owner=regular_user1)
+        OrderItemFactory.create_batch(5, product=chair, order=order1)
+        OrderItemFactory.create_batch(3, product=table, order=order1)
+        OrderItemFactory(product=lamp, order=order2)
+
+        mocked_authentication(active_user=regular_user1)
+        url = reverse(ORDER_LIST_URL)
+
+        response = api_client.get(url + "?search=red")
+        assert [order["id"] for order in response.json()["results"]] == [order1.id]
+        assert response.json()["total"] == 1
+        assert api_client.get(url + "?search=red wooden").json()["total"] == 1
+        assert api_client.get(url + "?search=brass").json()["total"] == 1
+        assert api_client.get(url + "?search=red brass").json()["total"] == 0
+        assert api_client.get(url + "?search=sofa").json()["total"] == 0
+
+    def test_list_orders_cached_count_is_invalidated_on_write(self, mocked_authentication, api_client, django_assert_num_queries):
+        regular_user1 = UserFactory(role='regular_user')
+        OrderFactory.create_batch(2, owner=regular_user1)
+        mocked_authentication(active_user=regular_user1)
+        url = reverse(ORDER_LIST_URL)
+
+        assert api_client.get(url).json()["total"] == 2
+        # validators and count come from the cache, only the page is read
+        with django_assert_num_queries(1):
+            assert api_client.get(url).json()["total"] == 2
+        OrderFactory(owner=regular_user1)
+        assert api_client.get(url).json()["total"] == 3
+
     def test_get_order(self, mocked_authentication, api_client):
         initiator = UserFactory(role='admin')
         product1 = ProductFactory(created_by=initiator)
@@ -107,6 +349,95 @@ class TestOrderEndpoints:
         assert Order.objects.count() == 1
         assert len(response.data["items"]) == 2
 
+    def test_conditional_get_order(self, mocked_authentication, api_client):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, quantity=10)
+        regular_user1 = UserFactory(role='regular_user')
+        order1 = OrderFactory(owner=regular_user1)
+        item = OrderItemFactory(product=product1, order=order1)
+
+        mocked_authentication(active_user=regular_user1)
+        detail_url = reverse(ORDER_DETAIL_URL, kwargs={'pk': order1.id})
+        list_url = reverse(ORDER_LIST_URL)
+        detail_etag = api_client.get(detail_url)["ETag"]
+        list_etag = api_client.get(list_url)["ETag"]
+        assert api_client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code == 304
+        assert api_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == 304
+
+        modify_url = reverse(MODIFY_ITEM_URL, kwargs={'pk': order1.id, "item_id": item.id})
+        api_client.patch(modify_url, data={"product": product1.id, "quantity_required": 4}, format="json")
+        assert api_client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code == 200
+        assert api_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == 200
+
+    def test_order_values_path_matches_serializer(self, mocked_authentication_with_role, api_client, django_assert_num_queries):
+        initiator = UserFactory(role='admin', lastname=None)
+        product1 = ProductFactory(created_by=initiator, quantity=10)
+        product2 = ProductFactory(created_by=initiator, quantity=10)
+        order1 = OrderFactory(owner=initiator, status="completed")
+        OrderItemFactory(product=product2, order=order1, total_price=Decimal("1.5"))
+        OrderItemFactory(product=product1, order=order1, quantity_required=None)
+        OrderFactory(owner=initiator)
+
+        mocked_authentication_with_role(active_user=initiator, role='admin')
+        orders = Order.objects.select_related("owner").prefetch_related(
+            Prefetch("orderitem_set", queryset=OrderItem.objects.order_by("id"))
+        ).order_by('-created_at', '-id')
+        with django_assert_num_queries(3):
+            response = api_client.get(reverse(ORDER_LIST_URL), {"include": "items"})
+        assert JSONRenderer().render(response.data["results"]) == JSONRenderer().render(
+            OrderDetailSerializer(orders, many=True).data
+        )
+        response = api_client.get(reverse(ORDER_LIST_URL))
+        assert JSONRenderer().render(response.data["results"]) == JSONRenderer().render(
+            OrderSummarySerializer(Order.objects.order_by('-created_at', '-id'), many=True).data
+        )
+
+        response = api_client.get(reverse(ORDER_DETAIL_URL, kwargs={'pk': order1.id}))
+        assert JSONRenderer().render(response.data) == JSONRenderer().render(OrderDetailSerializer(orders.get(pk=order1.id)).data)
+        assert api_client.get(reverse(ORDER_DETAIL_URL, kwargs={'pk': 99999})).status_code == 404
+
+    def test_list_orders_with_sparse_fields(self, mocked_authentication, api_client, django_assert_num_queries):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, quantity=10)
+        regular_user1 = UserFactory(role='regular_user')
+        order1 = OrderFactory(owner=regular_user1)
+        OrderItemFactory(product=product1, order=order1)
+
+        mocked_authentication(active_user=regular_user1)
+        api_client.get(reverse(ORDER_LIST_URL), {"fields": "id,status"})
+        # validators are cached, the page is read without joining the owner or fetching the items
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse(ORDER_LIST_URL), {"fields": "id,status"})
+        assert response.json()["results"] == [{"id": order1.id, "status": "pending"}]
+
+        response = api_client.get(reverse(ORDER_DETAIL_URL, kwargs={'pk': order1.id}), {"exclude": "items"})
+        assert response.status_code == 200
+        assert "items" not in response.json() and response.json()["owner"] == regular_user1.fullname
+
+    def test_list_orders_embeds_items_on_request(self, mocked_authentication, api_client):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, quantity=10)
+        product2 = ProductFactory(created_by=initiator, quantity=10)
+        regular_user1 = UserFactory(role='regular_user')
+        order1, = place_orders([(Order(owner=regular_user1), [
+            OrderItem(product=product1, quantity_required=1, total_price=Decimal("4.25")),
+            OrderItem(product=product2, quantity_required=1, total_price=Decimal("1.50")),
+        ])])
+        OrderFactory(owner=regular_user1)
+
+        mocked_authentication(active_user=regular_user1)
+        results = api_client.get(reverse(ORDER_LIST_URL)).json()["results"]
+        assert [(order["item_count"], order["total_amount"]) for order in results] == [(0, "0.00"), (2, "5.75")]
+        assert "items" not in results[0]
+
+        results = api_client.get(reverse(ORDER_LIST_URL), {"include": "items"}).json()["results"]
+        assert [len(order["items"]) for order in results] == [0, 2]
+
+        detail_url = reverse(ORDER_DETAIL_URL, kwargs={'pk': order1.id})
+        assert len(api_client.get(detail_url).json()["items"]) == 2
+        assert api_client.get(detail_url, {"include": ""}).json()["item_count"] == 2
+        assert api_client.get(reverse(ORDER_LIST_URL), {"include": "owner"}).status_code == 400
+
     def test_delete_order(
         self,
         mocked_authentication,
@@ -233,6 +564,47 @@ class TestOrderEndpoints:
         item.refresh_from_db()
         assert item.quantity_required == 4
 
+    def test_order_totals_are_maintained(self, mocked_authentication, api_client):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, quantity=20, price=Decimal("2.50"))
+        product2 = ProductFactory(created_by=initiator, quantity=20, price=Decimal("10.00"))
+        regular_user1 = UserFactory(role='regular_user')
+        mocked_authentication(active_user=regular_user1)
+        payload = {"items": [
+            {"product": product1.id, "quantity_required": 2},
+            {"product": product2.id, "quantity_required": 1},
+        ]}
+
+        first = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").json()
+        second = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").json()
+        assert (first["item_count"], first["total_amount"]) == (2, "15.00")
+
+        item = OrderItem.objects.get(order_id=first["id"], product=product2)
+        url = reverse(MODIFY_ITEM_URL, kwargs={'pk': second["id"], "item_id": item.id})
+        api_client.patch(url, data={"product": product1.id, "quantity_required": 4}, format="json")
+        totals = dict(Order.objects.values_list("id", "total_amount"))
+        assert (totals[first["id"]], totals[second["id"]]) == (Decimal("5.00"), Decimal("25.00"))
+        assert Order.objects.get(pk=second["id"]).item_count == 3
+
+        results = api_client.get(reverse(ORDER_LIST_URL), {"min_total": "20"}).json()["results"]
+        assert [order["id"] for order in results] == [second["id"]]
+
+    def test_recompute_order_totals_command(self):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator)
+        order = OrderFactory(owner=initiator)
+        OrderItemFactory(product=product1, order=order, total_price=Decimal("4.23"))
+        OrderFactory(owner=initiator)
+
+        with pytest.raises(CommandError):
+            call_command("recompute_order_totals", "--verify", stdout=StringIO())
+        out = StringIO()
+        call_command("recompute_order_totals", "--batch-size", "1", stdout=out)
+        assert "Checked 2 orders, fixed 1" in out.getvalue()
+        order.refresh_from_db()
+        assert (order.item_count, order.total_amount) == (1, Decimal("4.23"))
+        call_command("recompute_order_totals", "--verify", stdout=StringIO())
+
     @pytest.mark.parametrize(
         "role, status_code",
         [
@@ -270,3 +642,310 @@ class TestOrderEndpoints:
             assert 'data' in response.data
             assert 'total_sales_amount' in response.data
             
+
+    @pytest.mark.parametrize("stream_format", ["ndjson", "csv"])
+    def test_stream_sales_report(self, mocked_authentication_with_role, api_client, stream_format):
+        """stream sales report items with the total as trailer"""
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator)
+        regular_user1 = UserFactory(role='regular_user')
+        order = OrderFactory(owner=regular_user1)
+        OrderItemFactory(product=product1, total_price=6.00, order=order)
+        OrderItemFactory(product=product1, total_price=8.00, order=order)
+
+        start_date = "2000-01-01T00:00:00.000000Z"
+        end_date = "2999-12-31T23:59:59.999999Z"
+        url = reverse(GENERATE_SALES_REPORT_URL)
+        joined_url = f"{url}?start_date={start_date}&end_date={end_date}&stream={stream_format}"
+        mocked_authentication_with_role(active_user=initiator, role='admin')
+        response = api_client.post(joined_url, format="json")
+
+        assert response.status_code == 200
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert len(lines) == (4 if stream_format == "csv" else 3)
+        if stream_format == "ndjson":
+            assert json.loads(lines[0])["total_price"] == "6.00"
+            assert json.loads(lines[-1]) == {"total_sales_amount": "14.00"}
+        else:
+            assert lines[0] == "id,quantity_required,total_price,product,order"
+            assert lines[-1] == "total_sales_amount,14.00"
+
+    def test_stream_sales_report_rejects_unknown_format(self, mocked_authentication_with_role, api_client):
+        active_user = UserFactory()
+        url = reverse(GENERATE_SALES_REPORT_URL)
+        joined_url = f"{url}?start_date=2024-01-01T00:00:00.000000Z&end_date=2024-12-31T23:59:59.999999Z&stream=xml"
+        mocked_authentication_with_role(active_user=active_user, role='admin')
+        response = api_client.post(joined_url, format="json")
+        assert response.status_code == 400
+
+    def test_daily_sales_rollup_matches_raw_scan(self, mocked_authentication_with_role, api_client):
+        """rollup stays in step with order creation, item changes, status flips and deletes"""
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, price=3.00, quantity=20)
+        product2 = ProductFactory(created_by=initiator, price=2.00, quantity=20)
+        regular_user1 = UserFactory(role='regular_user')
+
+        mocked_authentication_with_role(active_user=regular_user1, role='regular_user')
+        payload = {"items": [{"product": product1.id, "quantity_required": 2}, {"product": product2.id, "quantity_required": 4}]}
+        order1_id = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").data["id"]
+        order2_id = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").data["id"]
+        item = OrderItem.objects.filter(order_id=order1_id, product=product1).get()
+        modify_url = reverse(MODIFY_ITEM_URL, kwargs={'pk': order1_id, "item_id": item.id})
+        api_client.patch(modify_url, data={"product": product2.id, "quantity_required": 1}, format="json")
+
+        mocked_authentication_with_role(active_user=regular_user1, role='admin')
+        api_client.post(reverse(CANCEL_ORDER_URL, kwargs={'pk': order2_id}))
+        OrderFactory(owner=regular_user1)
+        api_client.delete(reverse(ORDER_DETAIL_URL, kwargs={'pk': order2_id}))
+
+        today = timezone.localdate().isoformat()
+        url = f"{reverse(DAILY_SALES_REPORT_URL)}?start_date={today}&end_date={today}"
+        rollup = api_client.get(url).json()
+        raw = api_client.get(f"{url}&source=raw").json()
+
+        assert rollup["data"] == raw["data"]
+        assert rollup["total_sales_amount"] == raw["total_sales_amount"] == 10.0
+        assert {row["status"] for row in rollup["data"]} == {"pending"}
+
+    def test_customer_product_summary_matches_raw_scan(self, mocked_authentication_with_role, api_client):
+        """summary stays in step with order creation, item changes, cancellations and deletes"""
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator, price=3.00, quantity=20)
+        product2 = ProductFactory(created_by=initiator, price=2.00, quantity=20)
+        product3 = ProductFactory(created_by=initiator, price=1.00, quantity=20)
+        customer = UserFactory(role='regular_user')
+
+        mocked_authentication_with_role(active_user=customer, role='regular_user')
+        payload = {"items": [{"product": product1.id, "quantity_required": 2}, {"product": product2.id, "quantity_required": 4}]}
+        order1_id = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").data["id"]
+        order2_id = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").data["id"]
+        payload = {"items": [{"product": product3.id, "quantity_required": 1}]}
+        order3_id = api_client.post(reverse(CREATE_ORDER_URL), data=payload, format="json").data["id"]
+        item = OrderItem.objects.filter(order_id=order1_id, product=product1).get()
+        modify_url = reverse(MODIFY_ITEM_URL, kwargs={'pk': order1_id, "item_id": item.id})
+        api_client.patch(modify_url, data={"product": product2.id, "quantity_required": 1}, format="json")
+
+        mocked_authentication_with_role(active_user=initiator, role='admin')
+        api_client.post(reverse(CANCEL_ORDER_URL, kwargs={'pk': order2_id}))
+        api_client.post(reverse(CANCEL_ORDER_URL, kwargs={'pk': order3_id}))
+        api_client.post(reverse(SET_PENDING_URL, kwargs={'pk': order3_id}))
+        api_client.delete(reverse(ORDER_DETAIL_URL, kwargs={'pk': order1_id}))
+
+        mocked_authentication_with_role(active_user=customer, role='regular_user')
+        report = api_client.get(reverse(FREQUENT_REPORT_URL)).json()
+        today = timezone.localdate().isoformat()
+        window = api_client.get(reverse(FREQUENT_REPORT_URL), {"start_date": today, "end_date": today}).json()
+
+        assert window == report
+        assert [(row["product"], row["total_quantity_required"]) for row in report["data"]] == [(product3.id, 1)]
+        summaries = {summary.product_id: summary for summary in CustomerProductSummary.objects.filter(owner=customer)}
+        assert summaries[product3.id].last_purchased_at == Order.objects.get(pk=order3_id).created_at
+        assert summaries[product2.id].last_purchased_at is None
+        assert (summaries[product2.id].item_count, summaries[product2.id].total_spend) == (0, Decimal("0.00"))
+
+    def test_purchase_summary_removals_at_batch_scale(self):
+        """removals touching more summaries than SQLite's expression depth limit are refreshed in chunks"""
+        admin = UserFactory(role='admin')
+        customers = UserFactory.create_batch(4, role='regular_user')
+        products = Product.objects.bulk_create(
+            [Product(name=f"product {index}", price=1, quantity=10, created_by=admin) for index in range(1200)]
+        )
+        orders_with_items = [
+            (
+                Order(owner=customers[index % 4]),
+                [OrderItem(product=products[3 * index + offset], quantity_required=1, total_price=Decimal("1.00")) for offset in range(3)],
+            )
+            for index in range(400)
+        ]
+        place_orders(orders_with_items)
+        Order.objects.update(status="cancelled")
+
+        deltas = None
+        for order, items in orders_with_items:
+            deltas = collect_purchase_deltas(order, items, sign=-1, deltas=deltas)
+        apply_purchase_deltas(deltas)
+
+        assert CustomerProductSummary.objects.filter(item_count=0, last_purchased_at__isnull=True).count() == 1200
+
+    def test_frequent_report_top_and_window(self, mocked_authentication_with_role, api_client):
+        initiator = UserFactory(role='admin')
+        customer = UserFactory(role='regular_user')
+        products = ProductFactory.create_batch(5, created_by=initiator)
+        order = OrderFactory(owner=customer)
+        for quantity, product in enumerate(products, start=1):
+            OrderItemFactory(product=product, order=order, quantity_required=quantity)
+        call_command("rebuild_customer_summaries", stdout=StringIO())
+        mocked_authentication_with_role(active_user=customer, role='regular_user')
+
+        response = api_client.get(reverse(FREQUENT_REPORT_URL), {"top": 2})
+        assert [row["total_quantity_required"] for row in response.data["data"]] == [5, 4]
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        assert api_client.get(reverse(FREQUENT_REPORT_URL), {"start_date": tomorrow}).data["count"] == 0
+        assert api_client.get(reverse(FREQUENT_REPORT_URL), {"top": 0}).status_code == 400
+
+    @pytest.mark.parametrize("params", [{}, {"start_date": "2000-01-01"}])
+    def test_frequent_report_query_count_is_independent_of_products(
+        self, mocked_authentication_with_role, api_client, django_assert_num_queries, params
+    ):
+        """product names come from the report query itself"""
+        initiator = UserFactory(role='admin')
+        customer = UserFactory(role='regular_user')
+        mocked_authentication_with_role(active_user=customer, role='regular_user')
+        url = reverse(FREQUENT_REPORT_URL)
+        for product_count in (1, 20):
+            order = OrderFactory(owner=customer)
+            for product in ProductFactory.create_batch(product_count, created_by=initiator):
+                OrderItemFactory(product=product, order=order)
+            call_command("rebuild_customer_summaries", stdout=StringIO())
+
+            with django_assert_num_queries(1):
+                response = api_client.get(url, params)
+
+            assert response.status_code == 200
+            names = dict(Product.objects.values_list("id", "name"))
+            assert [row["product_name"] for row in response.data["data"]] == [names[row["product"]] for row in response.data["data"]]
+
+    def test_rebuild_sales_rollup_command(self):
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator)
+        order = OrderFactory(owner=initiator)
+        OrderItemFactory.create_batch(3, product=product1, order=order)
+        DailySalesRollup.objects.create(day=timezone.localdate(), product=product1, status="completed", item_count=9)
+
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+
+        rollup = DailySalesRollup.objects.get()
+        assert (rollup.status, rollup.item_count, rollup.quantity_sold) == ("pending", 3, 6)
+
+    def test_rollup_migration_backfills_existing_orders(self):
+        """orders placed before the rollup table existed are rolled up by its migration"""
+        backfill = import_module("order.migrations.0003_dailysalesrollup").backfill_daily_sales_rollup
+        initiator = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=initiator)
+        product2 = ProductFactory(created_by=initiator)
+        OrderItemFactory.create_batch(2, product=product1, order=OrderFactory(owner=initiator))
+        OrderItemFactory(product=product2, order=OrderFactory(owner=initiator, status="completed"))
+        DailySalesRollup.objects.all().delete()
+
+        backfill(django_apps, None)
+
+        assert list(rollup_daily_sales()) == list(raw_daily_sales())
+        assert DailySalesRollup.objects.count() == 2
+
+    def test_bulk_import_orders(self, mocked_authentication_with_role, api_client):
+        """import a batch of orders, reporting failures per record"""
+        admin = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=admin, price=2.00, quantity=5)
+        product2 = ProductFactory(created_by=admin, price=3.00, quantity=5)
+        customer = UserFactory(role='regular_user')
+        payload = [
+            {"owner": customer.id, "items": [{"product": product1.id, "quantity_required": 3}]},
+            {"owner": customer.id, "items": [{"product": 99999, "quantity_required": 1}]},
+            {"owner": customer.id, "items": [{"product": product1.id, "quantity_required": 3}]},
+            {"owner": customer.id, "status": "completed", "items": [{"product": product2.id, "quantity_required": 2}]},
+            {"owner": 99999, "items": [{"product": product2.id, "quantity_required": 1}]},
+        ]
+
+        mocked_authentication_with_role(active_user=admin, role='admin')
+        response = api_client.post(f"{reverse(BULK_IMPORT_URL)}?batch_size=2", data=payload, format="json")
+
+        assert response.status_code == 200
+        assert (response.data["created"], response.data["failed"]) == (2, 3)
+        assert [result["success"] for result in response.data["results"]] == [True, False, False, True, False]
+        assert Order.objects.count() == 2
+        assert OrderItem.objects.get(product=product2).total_price == Decimal("6.00")
+        product1.refresh_from_db()
+        assert product1.quantity == 2
+
+    def test_bulk_import_orders_from_ndjson(self, mocked_authentication_with_role, api_client):
+        admin = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=admin, quantity=2000)
+        customer = UserFactory(role='regular_user')
+        record = json.dumps({"owner": customer.id, "items": [{"product": product1.id, "quantity_required": 1}]})
+        body = "\n".join([record] * 1000)
+
+        mocked_authentication_with_role(active_user=admin, role='admin')
+        response = api_client.post(reverse(BULK_IMPORT_URL), data=body, content_type="application/x-ndjson")
+
+        assert response.status_code == 200
+        assert response.data["created"] == 1000
+        assert DailySalesRollup.objects.get().item_count == 1000
+
+    def test_import_orders_command(self, tmp_path):
+        admin = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=admin, quantity=10)
+        customer = UserFactory(role='regular_user')
+        path = tmp_path / "orders.ndjson"
+        path.write_text(json.dumps({"owner": customer.id, "items": [{"product": product1.id, "quantity_required": 4}]}) + "\n")
+        out = StringIO()
+
+        call_command("import_orders", str(path), stdout=out)
+
+        assert "Imported 1 orders, 0 failed" in out.getvalue()
+        assert Order.objects.filter(owner=customer).count() == 1
+
+    def test_report_job_is_built_in_the_background(self, mocked_authentication_with_role, api_client):
+        """identical requests share one job, whose result matches the synchronous report"""
+        admin = UserFactory(role='admin')
+        product1 = ProductFactory(created_by=admin)
+        order = OrderFactory(owner=UserFactory(role='regular_user'))
+        OrderItemFactory(product=product1, total_price=6.00, order=order)
+        OrderItemFactory(product=product1, total_price=8.00, order=order)
+        params = {"start_date": "2000-01-01T00:00:00.000000Z", "end_date": "2999-12-31T23:59:59.999999Z"}
+        mocked_authentication_with_role(active_user=admin, role='admin')
+
+        response = api_client.post(reverse(REPORT_JOB_LIST_URL), data={"kind": "sales", "params": params}, format="json")
+        assert response.status_code == 202
+        assert response.data["status"] == "queued"
+        job_id = response.data["id"]
+        again = api_client.post(reverse(REPORT_JOB_LIST_URL), data={"kind": "sales", "params": params}, format="json")
+        assert again.data["id"] == job_id
+        assert api_client.get(reverse(REPORT_JOB_RESULT_URL, args=[job_id])).status_code == 409
+
+        call_command("run_report_workers", "--workers", "1", "--once", stdout=StringIO())
+
+        assert api_client.get(reverse(REPORT_JOB_DETAIL_URL, args=[job_id])).data["status"] == "completed"
+        done = api_client.post(reverse(REPORT_JOB_LIST_URL), data={"kind": "sales", "params": params}, format="json")
+        assert (done.status_code, done.data["id"]) == (200, job_id)
+        result = api_client.get(reverse(REPORT_JOB_RESULT_URL, args=[job_id]))
+        sync = api_client.post(f"{reverse(GENERATE_SALES_REPORT_URL)}?start_date={params['start_date']}&end_date={params['end_date']}")
+        assert result.content == JSONRenderer().render(sync.data)
+        assert json.loads(result.content)["total_sales_amount"] == 14.0
+        compressed = api_client.get(reverse(REPORT_JOB_RESULT_URL, args=[job_id]), HTTP_ACCEPT_ENCODING="gzip")
+        assert compressed["Content-Encoding"] == "gzip"
+        assert compressed.content == bytes(ReportJob.objects.get(pk=job_id).result)
+
+        ReportJob.objects.filter(pk=job_id).update(expires_at=timezone.now())
+        assert api_client.get(reverse(REPORT_JOB_RESULT_URL, args=[job_id])).status_code == 410
+        assert api_client.post(reverse(REPORT_JOB_LIST_URL), data={"kind": "sales", "params": params}, format="json").data["id"] != job_id
+
+    def test_report_job_permissions_and_validation(self, mocked_authentication_with_role, api_client):
+        customer = UserFactory(role='regular_user')
+        other = UserFactory(role='regular_user')
+        mocked_authentication_with_role(active_user=customer, role='regular_user')
+        url = reverse(REPORT_JOB_LIST_URL)
+
+        assert api_client.post(url, data={"kind": "sales"}, format="json").status_code == 403
+        response = api_client.post(url, data={"kind": "frequent_purchased_products"}, format="json")
+        assert response.status_code == 202
+        assert ReportJob.objects.get().params == {"owner": customer.id, "top": None, "start_date": None, "end_date": None}
+        assert process_report_jobs("test", once=True) == 1
+
+        mocked_authentication_with_role(active_user=other, role='regular_user')
+        assert api_client.get(reverse(REPORT_JOB_DETAIL_URL, args=[response.data["id"]])).status_code == 404
+        assert api_client.post(url, data={"kind": "frequent_purchased_products"}, format="json").data["id"] != response.data["id"]
+
+        mocked_authentication_with_role(active_user=UserFactory(), role='admin')
+        assert api_client.post(url, data={"kind": "sales", "params": {"start_date": "2024"}}, format="json").status_code == 400
+
+    def test_stale_report_job_is_requeued(self):
+        admin = UserFactory(role='admin')
+        job = ReportJob.objects.create(kind="frequent_purchased_products", params={"owner": admin.id}, params_hash="x")
+        assert claim_report_job("dead-worker").status == "running"
+        assert claim_report_job("other-worker") is None
+
+        ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        assert requeue_stale_report_jobs() == (1, 0)
+        assert process_report_jobs("other-worker", once=True) == 1
+        job.refresh_from_db()
+        assert (job.status, job.attempts, job.worker) == ("completed", 2, "other-worker")
@@ -1,10 +1,12 @@
 from django.urls import path, include
-from .views import OrderViewSets
+from .views import OrderViewSets, ReportJobViewSets
 from rest_framework import routers
 
 app_name = "order"
 router = routers.DefaultRouter()
 
+# registered before the order routes, whose detail route would match report-jobs/
+router.register("report-jobs", viewset=ReportJobViewSets, basename="report-job")
 router.register("", viewset=OrderViewSets)
 
 urlpatterns = [path("", include(router.urls))]
@@ -1,60 +1,131 @@
+import gzip
 from rest_framework import viewsets, mixins, status,filters
+from rest_framework.reverse import reverse
 from rest_framework.decorators import action
-from .models import Order, OrderItem
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from core.conditional import ConditionalGetMixin
+from core.pagination import CursorPaginationMixin
+from core.sparse import SparseFieldsMixin, parse_field_list
+from core.values import ValuesReadMixin
+from core.parsers import FastJSONParser, NDJSONParser
+from .filters import OrderFilter, OrderProductSearchFilter
+from .models import Order, OrderItem, ReportJob
 from .serializers import (
     OrderCreationSerializer,
     OrderDetailSerializer,
+    OrderValuesSerializer,
+    OrderSummarySerializer,
+    OrderSummaryValuesSerializer,
     OrderItemCreateSerializer,
     OrderItemListSerializer,
-    CustomerProductReportSerializer
+    CustomerProductReportSerializer,
+    DailySalesReportSerializer,
+    ReportJobSerializer,
+    OrderBulkTransitionSerializer,
 )
 from django.db.models.functions import Cast
+from django.http import HttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from user.permissions import IsAdmin
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 from user.permissions import IsRegularUser
-from datetime import datetime
-from django.db.models import Sum, F
+from datetime import date
+from .enums import ORDER_STATUSES
+from django.db.models import Prefetch
 from decimal import Decimal
-from .models import OrderItem
+from .imports import IMPORT_BATCH_SIZE, import_orders
+from .report_jobs import REPORTS, clean_report_params, enqueue_report_job
+from .reports import (
+    SALES_REPORT_STREAM_FORMATS,
+    build_frequent_purchased_product_report,
+    build_sales_report,
+    parse_frequent_report_params,
+    parse_sales_report_date,
+    sales_report_items,
+    stream_sales_report,
+)
+from .rollups import DAILY_SALES_SOURCES, raw_daily_sales, rollup_daily_sales
+from .services import BULK_TRANSITION_MAX_ORDERS, delete_order, modify_order_item, set_order_status, transition_orders
+
+INCLUDE_PARAM = "include"
+INCLUDE_OPTIONS = ("items",)
+INCLUDE_SCHEMA = OpenApiParameter(
+    name=INCLUDE_PARAM,
+    description="'items' embeds the order items, otherwise item_count and total_amount are returned "
+    "(list defaults to no items, retrieve to items)",
+    required=False,
+    type=OpenApiTypes.STR,
+)
+
 
+@extend_schema_view(
+    list=extend_schema(parameters=[INCLUDE_SCHEMA]),
+    retrieve=extend_schema(parameters=[INCLUDE_SCHEMA]),
+)
 class OrderViewSets(
+    SparseFieldsMixin,
+    ValuesReadMixin,
+    ConditionalGetMixin,
+    CursorPaginationMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet,
 ):
     permission_classes = [IsAuthenticated]
-    queryset = Order.objects.select_related("owner").prefetch_related("orderitem_set").all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['owner', 'status']
-    search_fields = [
-        'orderitem__product__name',
-        'orderitem__product__description',
+    queryset = Order.objects.select_related("owner").all()
+    count_strategy = "cached"
+    values_serializer_classes = (OrderValuesSerializer, OrderSummaryValuesSerializer)
+    filter_backends = [DjangoFilterBackend, OrderProductSearchFilter, filters.OrderingFilter]
+    filterset_class = OrderFilter
+    product_search_fields = [
+        'name',
+        'description',
     ]
     ordering_fields = [
         'created_at',
     ]
+    ordering = ['-created_at', '-id']
 
     def get_queryset(self):
-        if self.request.user.role == 'admin':
-            return self.queryset
-        return self.queryset.filter(owner=self.request.user)
+        queryset = self.queryset
+        if self.request.user.role != 'admin':
+            queryset = queryset.filter(owner=self.request.user)
+        if self.action in ["list", "retrieve"] and "items" not in self.get_includes():
+            return queryset
+        return queryset.prefetch_related(Prefetch("orderitem_set", queryset=OrderItem.objects.order_by("id")))
+
+    def get_includes(self):
+        """?include=items embeds the items, by default only retrieve does"""
+        value = self.request.query_params.get(INCLUDE_PARAM)
+        if value is None:
+            return {"items"} if self.action == "retrieve" else set()
+        includes = set(parse_field_list(value))
+        unknown = includes - set(INCLUDE_OPTIONS)
+        if unknown:
+            raise ValidationError({INCLUDE_PARAM: [f"Unknown include(s): {', '.join(sorted(unknown))}"]})
+        return includes
+
+    def perform_destroy(self, instance):
+        delete_order(instance)
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
-            return OrderDetailSerializer
+            return OrderDetailSerializer if "items" in self.get_includes() else OrderSummarySerializer
         elif self.action == 'modify_item':
             return OrderItemCreateSerializer
         elif self.action == 'create_order_with_items':
             return OrderCreationSerializer
         elif self.action == 'generate_frequent_purchased_product':
             return CustomerProductReportSerializer
+        elif self.action == 'generate_daily_sales_report':
+            return DailySalesReportSerializer
         else:
             return None
 
@@ -77,6 +148,49 @@ class OrderViewSets(
 
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="batch_size",
+                description="number of orders written per transaction",
+                required=False,
+                type=OpenApiTypes.INT,
+            ),
+        ],
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        permission_classes=[IsAdmin],
+        parser_classes=[FastJSONParser, NDJSONParser],
+        url_path='bulk-import',
+    )
+    def bulk_import_orders(self, request, *args, **kwargs):
+        """create many orders from a JSON array or an NDJSON stream, reporting the result of every record"""
+        if not isinstance(request.data, list):
+            return Response(
+                data={"error": "Expected a list of orders"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            batch_size = int(request.query_params.get("batch_size", IMPORT_BATCH_SIZE))
+        except ValueError:
+            batch_size = 0
+        if batch_size <= 0:
+            return Response(
+                data={"error": "batch_size must be a positive number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = import_orders(request.data, batch_size)
+        created = sum(1 for result in results if result["success"])
+        response = {
+            "created": created,
+            "failed": len(results) - created,
+            "results": results,
+        }
+        return Response(data=response, status=status.HTTP_200_OK)
+
     @action(
         methods=['POST'],
         detail=True,
@@ -87,8 +201,7 @@ class OrderViewSets(
     def complete_order(self, request, pk=None):
         """set order to completed"""
         order = self.get_object()
-        order.status = "completed"
-        order.save()
+        set_order_status(order, "completed")
         response = {
             "message": "Order status completed successfully",
         }
@@ -104,8 +217,7 @@ class OrderViewSets(
     def cancel_order(self, request, pk=None):
         """set order to cancelled"""
         order = self.get_object()
-        order.status = "cancelled"
-        order.save()
+        set_order_status(order, "cancelled")
         response = {
             "message": "Order status cancelled successfully",
         }
@@ -121,13 +233,48 @@ class OrderViewSets(
     def set_pending(self, request, pk=None):
         """set order to pending"""
         order = self.get_object()
-        order.status = "pending"
-        order.save()
+        set_order_status(order, "pending")
         response = {
             "message": "Order status pending successfully",
         }
         return Response(data=response, status=status.HTTP_200_OK)
 
+    @extend_schema(request=OrderBulkTransitionSerializer)
+    @action(
+        methods=['POST'],
+        detail=False,
+        permission_classes=[IsAdmin],
+        serializer_class=None,
+        url_path='bulk-transition',
+    )
+    def bulk_transition(self, request, pk=None):
+        """move many orders, given as ids or an order filter, to a status with one UPDATE per current status"""
+        serializer = OrderBulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        new_status = serializer.validated_data["status"]
+        order_ids = serializer.validated_data.get("ids")
+        if order_ids is None:
+            params = serializer.validated_data["filter"]
+            unknown = set(params) - set(OrderFilter.base_filters)
+            if unknown:
+                raise ValidationError({"filter": [f"Unknown filter(s): {', '.join(sorted(unknown))}"]})
+            filterset = OrderFilter(data=params, queryset=Order.objects.all())
+            if not filterset.is_valid():
+                raise ValidationError({"filter": filterset.errors})
+            order_ids = list(filterset.qs.order_by().values_list("pk", flat=True)[:BULK_TRANSITION_MAX_ORDERS + 1])
+            if len(order_ids) > BULK_TRANSITION_MAX_ORDERS:
+                raise ValidationError(
+                    {"filter": [f"The filter matches more than {BULK_TRANSITION_MAX_ORDERS} orders, narrow it down"]}
+                )
+
+        transitioned, rejected = transition_orders(order_ids, new_status)
+        response = {
+            "status": new_status,
+            "transitioned": transitioned,
+            "rejected": rejected,
+        }
+        return Response(data=response, status=status.HTTP_200_OK)
+
     @action(
         methods=['PATCH'],
         detail=True,
@@ -142,11 +289,7 @@ class OrderViewSets(
         serializer = OrderItemCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        order_item.order=order
-        order_item.product = serializer.validated_data['product']
-        order_item.quantity_required = serializer.validated_data['quantity_required']
-        order_item.total_price = serializer.validated_data['total_price']
-        order_item.save()
+        modify_order_item(order_item, order, **serializer.validated_data)
 
         response = {
             "message": "Order item updated successfully",
@@ -168,6 +311,13 @@ class OrderViewSets(
                 required=True,
                 type=OpenApiTypes.STR,
             ),
+            OpenApiParameter(
+                name="stream",
+                description="stream the report instead of returning one JSON body: 'ndjson' or 'csv'",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=SALES_REPORT_STREAM_FORMATS,
+            ),
         ],
     )
     @action(
@@ -178,27 +328,110 @@ class OrderViewSets(
     )
     def generate_sales_report(self, request, *args, **kwargs):
         """generate sales report by date range.."""
-        start_date_str = request.query_params["start_date"]
-        end_date_str = request.query_params["end_date"]
+        start_date = parse_sales_report_date(request.query_params["start_date"])
+        end_date = parse_sales_report_date(request.query_params["end_date"])
 
-        start_date = timezone.make_aware(datetime.strptime(start_date_str, "%Y-%m-%dT%H:%M:%S.%fZ"))
-        end_date = timezone.make_aware(datetime.strptime(end_date_str, "%Y-%m-%dT%H:%M:%S.%fZ"))
-        date_range = (start_date, end_date)
+        stream_format = request.query_params.get("stream")
+        if stream_format and stream_format not in SALES_REPORT_STREAM_FORMATS:
+            return Response(
+                data={"error": f"stream must be one of {', '.join(SALES_REPORT_STREAM_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        ordered_items = OrderItem.objects.filter(order__created_at__range=date_range).select_related('order')
+        if stream_format:
+            return stream_sales_report(sales_report_items(start_date, end_date), stream_format)
+        return Response(data=build_sales_report(start_date, end_date), status=status.HTTP_200_OK)
 
-        total_sales_amount = ordered_items.aggregate(
-            total_sales_amount=Sum(
-                F('total_price')
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="start_date",
+                description="First day in the format 'YYYY-MM-DD'",
+                required=True,
+                type=OpenApiTypes.DATE,
+            ),
+            OpenApiParameter(
+                name="end_date",
+                description="Last day in the format 'YYYY-MM-DD'",
+                required=True,
+                type=OpenApiTypes.DATE,
+            ),
+            OpenApiParameter(
+                name="status",
+                description="only include orders with this status",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=[choice for choice, _ in ORDER_STATUSES],
+            ),
+            OpenApiParameter(
+                name="source",
+                description="'rollup' (default) reads the daily rollup, 'raw' recomputes from order items",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=DAILY_SALES_SOURCES,
+            ),
+        ],
+    )
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAdmin],
+        url_path='generate-daily-sales-report',
+    )
+    def generate_daily_sales_report(self, request, *args, **kwargs):
+        """generate sales per day, product and order status from the daily rollup"""
+        try:
+            start_day = date.fromisoformat(request.query_params["start_date"])
+            end_day = date.fromisoformat(request.query_params["end_date"])
+        except (KeyError, ValueError):
+            return Response(
+                data={"error": "start_date and end_date are required in the format YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        source = request.query_params.get("source", "rollup")
+        if source not in DAILY_SALES_SOURCES:
+            return Response(
+                data={"error": f"source must be one of {', '.join(DAILY_SALES_SOURCES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        ).get('total_sales_amount', Decimal(0.00))
 
+        rows = rollup_daily_sales(start_day, end_day) if source == "rollup" else raw_daily_sales(start_day, end_day)
+        order_status = request.query_params.get("status")
+        if order_status:
+            rows = rows.filter(status=order_status)
+        rows = list(rows)
+
+        total_sales_amount = sum((row["total_sales_amount"] for row in rows), Decimal("0.00"))
         response = {
-            "data": OrderItemListSerializer(instance=ordered_items, many=True).data,
-            "total_sales_amount": round(total_sales_amount,2),
+            "data": DailySalesReportSerializer(instance=rows, many=True).data,
+            "total_sales_amount": round(total_sales_amount, 2),
+            "source": source,
         }
         return Response(data=response, status=status.HTTP_200_OK)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="top",
+                description="only the N most ordered products",
+                required=False,
+                type=OpenApiTypes.INT,
+            ),
+            OpenApiParameter(
+                name="start_date",
+                description="only orders placed from this day, in the format 'YYYY-MM-DD'",
+                required=False,
+                type=OpenApiTypes.DATE,
+            ),
+            OpenApiParameter(
+                name="end_date",
+                description="only orders placed up to this day, in the format 'YYYY-MM-DD'",
+                required=False,
+                type=OpenApiTypes.DATE,
+            ),
+        ],
+    )
     @action(
         methods=['GET'],
         detail=False,
@@ -206,24 +439,72 @@ class OrderViewSets(
         url_path='generate-frequent-report-for-purchased-product',
     )
     def generate_frequent_purchased_product(self, request, *args, **kwargs):
-
-        qs = (
-            OrderItem.objects.filter(order__owner=self.request.user)
-            .values('product')
-            .annotate(
-                total_quantity_required=Sum('quantity_required'),
-                total_expenditure_on_product=Sum('total_price'),
+        """the products the user ordered most, from the customer product summary"""
+        try:
+            top, start_day, end_day = parse_frequent_report_params(request.query_params)
+        except ValueError:
+            return Response(
+                data={"error": "top must be a positive number, start_date and end_date in the format YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .order_by('-total_quantity_required')
+        return Response(
+            data=build_frequent_purchased_product_report(request.user, top, start_day, end_day),
+            status=status.HTTP_200_OK,
         )
 
-        serialized_data = CustomerProductReportSerializer(
-        instance=qs, many=True
-       ).data  
 
-        response = {
-        "data": serialized_data,
-       "count": len(serialized_data),
-        }
+class ReportJobViewSets(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """queue reports to be built by the run_report_workers command, poll them and download the result"""
 
-        return Response(data=response, status=status.HTTP_200_OK)
+    permission_classes = [IsAuthenticated]
+    serializer_class = ReportJobSerializer
+    queryset = ReportJob.objects.defer("result")
+
+    def get_queryset(self):
+        queryset = self.queryset
+        if self.request.user.role != 'admin':
+            queryset = queryset.filter(requested_by=self.request.user)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """queue a report, or return the job of an identical request"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        kind = serializer.validated_data["kind"]
+        if request.user.role != REPORTS[kind][0]:
+            raise PermissionDenied(f"Only {REPORTS[kind][0]} users can request the {kind} report.")
+        params = clean_report_params(kind, serializer.validated_data["params"], request.user)
+
+        job, _ = enqueue_report_job(kind, params, request.user)
+        return Response(
+            data=self.get_serializer(job).data,
+            status=status.HTTP_200_OK if job.status == "completed" else status.HTTP_202_ACCEPTED,
+            headers={"Location": reverse("order:report-job-detail", args=[job.pk], request=request)},
+        )
+
+    @action(methods=['GET'], detail=True, url_path='result')
+    def result(self, request, pk=None):
+        """download the report, gzip encoded when the client accepts it"""
+        job = self.get_object()
+        if job.status != "completed":
+            return Response(
+                data={"error": f"Report job is {job.status}", "status": job.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if job.expires_at <= timezone.now():
+            return Response(data={"error": "Report result expired"}, status=status.HTTP_410_GONE)
+
+        content = bytes(job.result)
+        response = HttpResponse(content_type="application/json")
+        if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+            response["Content-Encoding"] = "gzip"
+        else:
+            content = gzip.decompress(content)
+        response.content = content
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
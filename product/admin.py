@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Product
+from .models import Product, StockMovement, StockSnapshot
 
 # Register your models here.
 admin.site.register(Product)
+admin.site.register(StockMovement)
+admin.site.register(StockSnapshot)
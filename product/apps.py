@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from core.counts import connect_count_invalidation
+        from .cache import connect_product_invalidation
+        from .search import install_search_index_after_migrate
+
+        connect_count_invalidation(self.get_models())
+        connect_product_invalidation(self.get_model("Product"))
+        post_migrate.connect(install_search_index_after_migrate, sender=self)
@@ -0,0 +1,116 @@
+"""
+Read-through cache for hot product reads.
+
+Holds the serialized ListProductSerializer payload of a product and its (price, quantity)
+tuple. Entries are dropped on every Product post_save and post_delete (admin and shell edits
+included) and by the bulk writes that bypass signals (adjust_stock, bulk upserts), and once
+more when the writing transaction commits.
+Order items are priced from this cache, so with more than one process PRODUCT_CACHE_ALIAS
+has to point at a shared backend (e.g. redis or memcached): invalidating the default
+local-memory cache only reaches the process that made the change, and the others keep
+charging the old price for up to PRODUCT_CACHE_TIMEOUT seconds.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+PRODUCT_CACHE_ALIAS = getattr(settings, "PRODUCT_CACHE_ALIAS", "default")
+PRODUCT_CACHE_TIMEOUT = getattr(settings, "PRODUCT_CACHE_TIMEOUT", 300)
+HITS_KEY = "product:stats:hits"
+MISSES_KEY = "product:stats:misses"
+
+
+def product_cache():
+    return caches[PRODUCT_CACHE_ALIAS]
+
+
+def _payload_key(pk):
+    return f"product:payload:{pk}"
+
+
+def _stock_key(pk):
+    return f"product:stock:{pk}"
+
+
+def _count(key, amount):
+    if not amount:
+        return
+    cache = product_cache()
+    if not cache.add(key, amount, timeout=None):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.set(key, amount, timeout=None)
+
+
+def cache_stats():
+    cache = product_cache()
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": counters.get(HITS_KEY, 0), "misses": counters.get(MISSES_KEY, 0)}
+
+
+def get_product_payload(pk, build):
+    """the cached serialized product, build() produces and caches it on a miss"""
+    cache = product_cache()
+    payload = cache.get(_payload_key(pk))
+    if payload is not None:
+        _count(HITS_KEY, 1)
+        return payload
+    _count(MISSES_KEY, 1)
+    payload = dict(build())
+    cache.set(_payload_key(pk), payload, PRODUCT_CACHE_TIMEOUT)
+    return payload
+
+
+def get_price_quantities(product_ids):
+    """{product_id: (price, quantity)} for the products that exist, misses are read with one query"""
+    from .models import Product
+
+    cache = product_cache()
+    product_ids = set(product_ids)
+    cached = cache.get_many([_stock_key(pk) for pk in product_ids])
+    found = {pk: tuple(cached[_stock_key(pk)]) for pk in product_ids if _stock_key(pk) in cached}
+
+    missing = product_ids - found.keys()
+    if missing:
+        fetched = {
+            pk: (Decimal(price), quantity)
+            for pk, price, quantity in Product.objects.filter(id__in=missing).values_list("id", "price", "quantity")
+        }
+        cache.set_many({_stock_key(pk): value for pk, value in fetched.items()}, PRODUCT_CACHE_TIMEOUT)
+        found.update(fetched)
+    _count(HITS_KEY, len(product_ids) - len(missing))
+    _count(MISSES_KEY, len(missing))
+    return found
+
+
+def get_cached_products(product_ids):
+    """{product_id: Product} holding only id, price and quantity, for validation and foreign keys"""
+    from .models import Product
+
+    return {
+        pk: Product(id=pk, price=price, quantity=quantity)
+        for pk, (price, quantity) in get_price_quantities(product_ids).items()
+    }
+
+
+def invalidate_products(product_ids):
+    """drop the cached entries of the products, again once the open transaction commits"""
+    keys = [key for pk in product_ids for key in (_payload_key(pk), _stock_key(pk))]
+    product_cache().delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        # a read before the commit can cache the old row again
+        transaction.on_commit(lambda: product_cache().delete_many(keys))
+
+
+def _invalidate_product_receiver(sender, instance, **kwargs):
+    invalidate_products([instance.pk])
+
+
+def connect_product_invalidation(model):
+    """drop the cached entries of a product whenever it is saved or deleted"""
+    post_save.connect(_invalidate_product_receiver, sender=model, dispatch_uid="product-cache-save")
+    post_delete.connect(_invalidate_product_receiver, sender=model, dispatch_uid="product-cache-delete")
@@ -0,0 +1,9 @@
+STOCK_MOVEMENT_REASONS = (
+    ("created", "created"),
+    ("adjusted", "adjusted"),
+    ("order_placed", "order_placed"),
+    ("order_cancelled", "order_cancelled"),
+    ("order_restored", "order_restored"),
+    ("order_modified", "order_modified"),
+    ("order_deleted", "order_deleted"),
+)
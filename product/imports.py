@@ -0,0 +1,162 @@
+"""
+Bulk product upserts keyed on sku, used by the bulk-upsert action and the import_products command.
+
+Records are checked with the fields and rules of CreateProductSerializer, built once for the
+whole import, then written batch_size at a time with one bulk_create(update_conflicts=True) per
+batch. Fields a record leaves out keep their stored value (or the model default for new
+products). Invalid records are reported and skipped without failing the rest of their batch.
+When a batch holds a sku more than once the last record wins, the earlier ones are reported as
+superseded and never as created.
+"""
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from core.counts import invalidate_counts
+
+from .cache import invalidate_products
+from .models import Product, StockMovement
+from .serializers import CreateProductSerializer
+
+IMPORT_BATCH_SIZE = 1000
+UPSERT_FIELDS = ("name", "description", "quantity", "price", "reorder_point")
+REQUIRED_FIELDS = ("quantity", "price")
+SKU_MAX_LENGTH = Product._meta.get_field("sku").max_length
+
+
+class RecordValidator:
+    """validate product records with the fields and validate() of one CreateProductSerializer"""
+
+    def __init__(self):
+        self.serializer = CreateProductSerializer()
+        self.fields = {name: self.serializer.fields[name] for name in UPSERT_FIELDS}
+
+    def __call__(self, record):
+        """return (sku, attrs, None) for a valid record or (None, None, errors)"""
+        if not isinstance(record, dict):
+            return None, None, {"errors": ["Expected an object with sku, quantity and price"]}
+
+        errors = {}
+        sku = record.get("sku")
+        sku = sku.strip() if isinstance(sku, str) else sku
+        if not isinstance(sku, str) or not sku:
+            errors["sku"] = ["This field is required."]
+        elif len(sku) > SKU_MAX_LENGTH:
+            errors["sku"] = [f"Ensure this field has no more than {SKU_MAX_LENGTH} characters."]
+
+        attrs = {}
+        for name, field in self.fields.items():
+            value = record.get(name)
+            # empty CSV cells of number columns count as missing
+            if value is None and name not in record or value == "" and not isinstance(field, serializers.CharField):
+                if name in REQUIRED_FIELDS:
+                    errors[name] = ["This field is required."]
+                continue
+            try:
+                attrs[name] = field.run_validation(value)
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+        if not errors:
+            try:
+                self.serializer.validate(attrs)
+            except serializers.ValidationError as exc:
+                errors[api_settings.NON_FIELD_ERRORS_KEY] = exc.detail
+        if errors:
+            return None, None, errors
+        return sku, attrs, None
+
+
+def _upsert_batch(batch, user):
+    """write [(index, sku, attrs)], the last record of a sku wins, returns {sku: (product id, created)}"""
+    latest = {sku: attrs for _, sku, attrs in batch}
+    existing = {
+        row["sku"]: row
+        for row in Product.objects.select_for_update()
+        .filter(sku__in=latest)
+        .order_by()
+        .values("id", "sku", *UPSERT_FIELDS)
+    }
+
+    products = []
+    for sku, attrs in latest.items():
+        values = existing.get(sku) or {
+            name: Product._meta.get_field(name).get_default() for name in UPSERT_FIELDS
+        }
+        values = {name: values[name] for name in UPSERT_FIELDS} | attrs
+        products.append(
+            Product(
+                sku=sku,
+                created_by=user,
+                needs_reorder=values["quantity"] <= values["reorder_point"],
+                **values,
+            )
+        )
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=["sku"],
+        update_fields=[*UPSERT_FIELDS, "needs_reorder", "updated_at"],
+    )
+    if any(product.pk is None for product in products):
+        # backends that cannot return the ids of upserted rows
+        ids = dict(Product.objects.filter(sku__in=latest).values_list("sku", "id"))
+        for product in products:
+            product.pk = ids[product.sku]
+
+    movements = []
+    for product in products:
+        previous = existing.get(product.sku)
+        delta = product.quantity - (previous["quantity"] if previous else 0)
+        if delta or previous is None:
+            movements.append(
+                StockMovement(product_id=product.pk, delta=delta, reason="adjusted" if previous else "created")
+            )
+    StockMovement.objects.bulk_create(movements)
+    return {product.sku: (product.pk, product.sku not in existing) for product in products}
+
+
+def upsert_products(records, user, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create or update products from an iterable of records, batch_size records per transaction,
+    new products are created by user. Returns one result per record, in input order, with the
+    product id or the errors. The records are consumed lazily, so a file can be streamed in.
+    """
+    validate = RecordValidator()
+    results = []
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+        offset = len(results)
+        results.extend([None] * len(chunk))
+        batch = []
+        for position, record in enumerate(chunk):
+            sku, attrs, errors = validate(record)
+            if errors:
+                results[offset + position] = {"index": offset + position, "success": False, "errors": errors}
+            else:
+                batch.append((offset + position, sku, attrs))
+        if not batch:
+            continue
+
+        try:
+            with transaction.atomic():
+                written = _upsert_batch(batch, user)
+        except DatabaseError as error:
+            for index, _, _ in batch:
+                results[index] = {"index": index, "success": False, "errors": {"errors": [str(error)]}}
+            continue
+        seen = set()
+        for index, sku, _ in reversed(batch):
+            product_id, created = written[sku]
+            result = {"index": index, "success": True, "product": product_id, "created": created and sku not in seen}
+            if sku in seen:
+                result["superseded"] = True
+            results[index] = result
+            seen.add(sku)
+        invalidate_products([product_id for product_id, _ in written.values()])
+    invalidate_counts(Product)
+    return results
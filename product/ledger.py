@@ -0,0 +1,67 @@
+"""
+Stock ledger. Every change of Product.quantity appends a StockMovement (see Product.save and
+ProductManager.adjust_stock). compact_ledger folds the movements up to a cutoff into one
+StockSnapshot per product and deletes them, so the stock at any time is the latest snapshot
+taken by then plus the movements after it, a tail no longer than the compaction interval.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+
+from .models import Product, StockMovement, StockSnapshot
+
+LEDGER_COMPACTION_BATCH_SIZE = 500
+
+
+def stock_at(product_id, at):
+    """the stock of a product at a point in time, from one snapshot and the movements after it"""
+    snapshot = (
+        StockSnapshot.objects.filter(product_id=product_id, taken_at__lte=at)
+        .order_by("-taken_at")
+        .values_list("quantity", "taken_at")
+        .first()
+    )
+    movements = StockMovement.objects.filter(product_id=product_id, created_at__lte=at)
+    quantity = 0
+    if snapshot is not None:
+        quantity, taken_at = snapshot
+        movements = movements.filter(created_at__gt=taken_at)
+    return quantity + (movements.aggregate(total=Sum("delta"))["total"] or 0)
+
+
+def compact_ledger(before, batch_size=LEDGER_COMPACTION_BATCH_SIZE):
+    """
+    Fold the movements created up to before into a snapshot taken at before, batch_size products
+    per transaction. Returns (snapshots written, movements deleted).
+    """
+    snapshots = deleted = 0
+    last_pk = 0
+    while True:
+        product_ids = list(
+            Product.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size]
+        )
+        if not product_ids:
+            break
+        last_pk = product_ids[-1]
+        with transaction.atomic():
+            folded = dict(
+                StockMovement.objects.filter(product_id__in=product_ids, created_at__lte=before)
+                .order_by()
+                .values("product")
+                .annotate(total=Sum("delta"))
+                .values_list("product", "total")
+            )
+            if not folded:
+                continue
+            latest = StockSnapshot.objects.filter(product=OuterRef("pk"), taken_at__lte=before).order_by("-taken_at")
+            previous = dict(
+                Product.objects.filter(pk__in=folded)
+                .annotate(snapshot_quantity=Subquery(latest.values("quantity")[:1]))
+                .values_list("pk", "snapshot_quantity")
+            )
+            StockSnapshot.objects.bulk_create(
+                StockSnapshot(product_id=product_id, quantity=(previous.get(product_id) or 0) + total, taken_at=before)
+                for product_id, total in folded.items()
+            )
+            snapshots += len(folded)
+            deleted += StockMovement.objects.filter(product_id__in=folded, created_at__lte=before).delete()[0]
+    return snapshots, deleted
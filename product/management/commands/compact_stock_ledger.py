@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from product.ledger import LEDGER_COMPACTION_BATCH_SIZE, compact_ledger
+
+
+class Command(BaseCommand):
+    help = "Fold stock movements older than some days into per-product snapshots and delete them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=int, default=30, help="keep the movements of this many days (default 30)"
+        )
+        parser.add_argument("--batch-size", type=int, default=LEDGER_COMPACTION_BATCH_SIZE, help="products per transaction")
+
+    def handle(self, *args, **options):
+        if options["older_than_days"] < 0 or options["batch_size"] <= 0:
+            raise CommandError("--older-than-days must not be negative and --batch-size must be positive")
+        before = timezone.now() - timedelta(days=options["older_than_days"])
+        snapshots, deleted = compact_ledger(before, options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Folded {deleted} stock movements into {snapshots} snapshots taken at {before.isoformat()}")
+        )
@@ -0,0 +1,60 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.parsers import loads
+from product.imports import IMPORT_BATCH_SIZE, upsert_products
+from user.models import User
+
+FORMATS = ("csv", "ndjson")
+
+
+def read_records(handle, file_format):
+    """yield the records of a CSV file with a header row or of an NDJSON file, one line at a time"""
+    if file_format == "csv":
+        try:
+            yield from csv.DictReader(handle)
+        except csv.Error as exc:
+            raise CommandError(f"Could not parse CSV: {exc}")
+        return
+    for line_number, line in enumerate(handle, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield loads(line)
+        except ValueError as exc:
+            raise CommandError(f"Could not parse line {line_number}: {exc}")
+
+
+class Command(BaseCommand):
+    help = "Create or update products by sku from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file with one product (sku, name, description, quantity, price, reorder_point) per record")
+        parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension, csv unless it is .ndjson or .jsonl")
+        parser.add_argument("--created-by", type=int, required=True, help="id of the user new products are created by")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be a positive number")
+        user = User.objects.filter(pk=options["created_by"]).first()
+        if user is None:
+            raise CommandError(f"No user with id {options['created_by']}")
+        file_format = options["format"] or ("ndjson" if options["path"].endswith((".ndjson", ".jsonl")) else "csv")
+
+        try:
+            with open(options["path"], encoding="utf-8", newline="") as handle:
+                results = upsert_products(read_records(handle, file_format), user, options["batch_size"])
+        except OSError as exc:
+            raise CommandError(f"Could not read {options['path']}: {exc}")
+        failed = [result for result in results if not result["success"]]
+        created = sum(1 for result in results if result["success"] and result["created"])
+        for result in failed:
+            self.stderr.write(f"record {result['index']}: {json.dumps(result['errors'])}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(results) - len(failed)} products ({created} created), {len(failed)} failed"
+            )
+        )
@@ -0,0 +1,79 @@
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from core.counts import invalidate_counts
+from .cache import invalidate_products
+
+
+class InsufficientStock(ValidationError):
+    """raised when products do not have enough quantity left, shortages maps product id to (requested, available)"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        messages = [
+            f"Insufficient stock for product {pk}: requested {requested}, available {available}"
+            for pk, (requested, available) in sorted(shortages.items())
+        ]
+        super().__init__({api_settings.NON_FIELD_ERRORS_KEY: messages})
+
+
+class ProductManager(models.Manager):
+
+    def lock_stock(self, product_ids):
+        """lock the products in id order and return {product_id: quantity}, call inside a transaction"""
+        return dict(self.select_for_update().filter(id__in=product_ids).order_by("id").values_list("id", "quantity"))
+
+    def adjust_stock(self, changes, reason="adjusted"):
+        """
+        Apply stock changes ({product_id: delta}, negative deltas take stock out) atomically.
+        The products are locked in id order so concurrent checkouts cannot deadlock or lose
+        updates, and every change is written with a single UPDATE and recorded in the stock
+        ledger with one INSERT.
+        """
+        from .models import StockMovement
+
+        changes = {pk: delta for pk, delta in changes.items() if delta}
+        if not changes:
+            return
+        with transaction.atomic(using=self.db):
+            available = self.lock_stock(changes)
+            shortages = {
+                pk: (-delta, available.get(pk) or 0)
+                for pk, delta in changes.items()
+                if delta < 0 and (available.get(pk) or 0) + delta < 0
+            }
+            if shortages:
+                raise InsufficientStock(shortages)
+
+            new_quantity = Case(
+                *[When(id=pk, then=Coalesce(F("quantity"), Value(0)) + delta) for pk, delta in changes.items()],
+                default=F("quantity"),
+                output_field=models.PositiveIntegerField(),
+            )
+            # the locked quantities give the new ones, compared with the reorder point of the row
+            needs_reorder = Case(
+                *[
+                    When(id=pk, reorder_point__gte=(available.get(pk) or 0) + delta, then=Value(True))
+                    for pk, delta in changes.items()
+                ],
+                default=Value(False),
+                output_field=models.BooleanField(),
+            )
+            now = timezone.now()
+            self.filter(id__in=changes).update(quantity=new_quantity, needs_reorder=needs_reorder, updated_at=now)
+            StockMovement.objects.bulk_create(
+                StockMovement(product_id=pk, delta=delta, reason=reason, created_at=now) for pk, delta in changes.items()
+            )
+        invalidate_counts(self.model)
+        invalidate_products(changes)
+
+    def reserve_stock(self, quantities, reason="order_placed"):
+        """take {product_id: quantity} out of stock, all or nothing"""
+        self.adjust_stock({pk: -quantity for pk, quantity in quantities.items()}, reason)
+
+    def release_stock(self, quantities, reason="order_cancelled"):
+        """put {product_id: quantity} back into stock"""
+        self.adjust_stock(dict(quantities), reason)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def flag_products_to_reorder(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    Product.objects.filter(quantity__isnull=True).update(quantity=0)
+    Product.objects.filter(quantity__lte=F('reorder_point')).update(needs_reorder=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='needs_reorder',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_point',
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.RunPython(flag_products_to_reorder, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='quantity',
+            field=models.PositiveIntegerField(blank=True, default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('needs_reorder', True)), fields=['quantity', 'id'], name='product_needs_reorder_idx'),
+        ),
+    ]
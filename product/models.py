@@ -1,20 +1,91 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from decimal import Decimal
+from .enums import STOCK_MOVEMENT_REASONS
+from .managers import ProductManager
+
+DEFAULT_REORDER_POINT = 10
 
 # Create your models here.
 
 
 class Product(models.Model):
+    # catalog identifier, bulk upserts match existing products on it
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255, null=True, blank=True)
     description = models.CharField(max_length=255, null=True, blank=True)
-    quantity = models.PositiveIntegerField(null=True,blank=True)
+    quantity = models.PositiveIntegerField(default=0, blank=True)
+    # products at or below their reorder point are flagged, see ProductManager.adjust_stock
+    reorder_point = models.PositiveIntegerField(default=DEFAULT_REORDER_POINT)
+    needs_reorder = models.BooleanField(default=False, editable=False)
     created_by = models.ForeignKey("user.User",on_delete=models.CASCADE,related_name="created_products")
     price = models.DecimalField(decimal_places=2,max_digits=10,default=Decimal(0.0))
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    objects = ProductManager()
+
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_at_id_idx'),
+            models.Index(fields=['quantity'], name='product_quantity_idx'),
+            models.Index(
+                fields=['quantity', 'id'], condition=models.Q(needs_reorder=True), name='product_needs_reorder_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.needs_reorder = (self.quantity or 0) <= self.reorder_point
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"quantity", "reorder_point"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "needs_reorder"}
+        if update_fields is not None and "quantity" not in update_fields:
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            # the stored quantity, locked, so the ledger records exactly what changed
+            previous = None
+            if self.pk is not None and not self._state.adding:
+                previous = Product.objects.select_for_update().filter(pk=self.pk).values_list("quantity", flat=True).first()
+            super().save(*args, **kwargs)
+            delta = (self.quantity or 0) - (previous or 0)
+            if delta or previous is None:
+                StockMovement.objects.create(
+                    product=self, delta=delta, reason="created" if previous is None else "adjusted"
+                )
 
     def __str__(self) -> str:
         return f"{self.name}"
+
+
+class StockMovement(models.Model):
+    """append-only ledger of stock changes, older rows are folded into StockSnapshot by compact_stock_ledger"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_movements")
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=STOCK_MOVEMENT_REASONS)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.delta:+d} of product {self.product_id} ({self.reason})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stockmovement_product_idx'),
+            models.Index(fields=['created_at'], name='stockmovement_created_at_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """the stock of a product once every movement up to taken_at is applied"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_snapshots")
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.quantity} of product {self.product_id} at {self.taken_at}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'taken_at'], name='unique_stock_snapshot'),
+        ]
@@ -0,0 +1,139 @@
+"""
+Full-text search over product name and description.
+
+On SQLite an external-content FTS5 table mirrors product_product through triggers, so every
+insert, update and delete (including bulk ones) keeps it in sync. On PostgreSQL a GIN expression
+index over the same SearchVector used by the queries is created instead. Both are installed
+after migrate by install_search_index, which is idempotent.
+"""
+import re
+
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+FTS_TABLE = "product_product_fts"
+SEARCH_VECTOR_INDEX = "product_search_vector_idx"
+SEARCH_CONFIG = "english"
+FULLTEXT_MODE = "fulltext"
+
+SQLITE_SEARCH_INDEX = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, content='product_product', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON product_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON product_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, description ON product_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+
+def _search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector("name", "description", config=SEARCH_CONFIG)
+
+
+def fulltext_supported(connection):
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def install_search_index(connection):
+    """create the full-text index and its triggers if they are missing"""
+    if not fulltext_supported(connection):
+        return
+    from .models import Product
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            if SEARCH_VECTOR_INDEX not in connection.introspection.get_constraints(cursor, Product._meta.db_table):
+                from django.contrib.postgres.indexes import GinIndex
+
+                with connection.schema_editor() as editor:
+                    editor.add_index(Product, GinIndex(_search_vector(), name=SEARCH_VECTOR_INDEX))
+            return
+
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        created = cursor.fetchone() is None
+        for statement in SQLITE_SEARCH_INDEX:
+            cursor.execute(statement)
+        if created:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def install_search_index_after_migrate(sender, using, **kwargs):
+    install_search_index(connections[using])
+
+
+def fulltext_search(queryset, terms):
+    """products matching every term as a word prefix, best match first"""
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        words = [word for term in terms for word in re.findall(r"\w+", term)]
+        query = SearchQuery(" & ".join(f"{word}:*" for word in words), config=SEARCH_CONFIG, search_type="raw")
+        return (
+            queryset.annotate(search_vector=_search_vector())
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F("search_vector"), query))
+            .order_by("-search_rank", "-created_at", "-id")
+        )
+
+    match = " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+    table = queryset.model._meta.db_table
+    return (
+        queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+        .annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+                [match],
+            )
+        )
+        # bm25 is lower for better matches
+        .order_by("search_rank", "-created_at", "-id")
+    )
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """SearchFilter that switches to ranked, prefix-matching full-text search with ?search_mode=fulltext"""
+
+    search_mode_param = "search_mode"
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.search_mode_param) != FULLTEXT_MODE:
+            return super().filter_queryset(request, queryset, view)
+        if not fulltext_supported(connections[queryset.db]):
+            return super().filter_queryset(request, queryset, view)
+
+        search_terms = [term.strip('"') for term in self.get_search_terms(request)]
+        search_terms = [term for term in search_terms if term]
+        if not search_terms:
+            return queryset
+        return fulltext_search(queryset, search_terms)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.search_mode_param,
+                "required": False,
+                "in": "query",
+                "description": "'fulltext' for ranked prefix matching on name and description",
+                "schema": {"type": "string", "enum": [FULLTEXT_MODE]},
+            },
+        ]
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core.values import ValuesSerializer
 from .models import Product
 
 
@@ -6,7 +7,7 @@ class CreateProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ["id", "name", "description", "quantity", "price"]
+        fields = ["id", "sku", "name", "description", "quantity", "price", "reorder_point"]
 
     def validate(self, attrs):
         quantity = attrs["quantity"]
@@ -28,3 +29,11 @@ class ListProductSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class LowStockProductSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ["id", "sku", "name", "quantity", "reorder_point", "price", "updated_at"]
+
+
+class ProductValuesSerializer(ValuesSerializer):
+    serializer_class = ListProductSerializer
@@ -1,12 +1,33 @@
 import pytest
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from user.test.factories import UserFactory
 from product.test.factories import ProductFactory
+from product.models import Product, StockMovement, StockSnapshot
+from product.cache import get_price_quantities, product_cache
+from product.imports import upsert_products
+from product.ledger import compact_ledger, stock_at
+from product.serializers import ListProductSerializer
+from rest_framework.renderers import JSONRenderer
+from decimal import Decimal
+from django.core.paginator import EmptyPage
+from core.counts import get_count
+from core.pagination import CountStrategyPaginator
 pytestmark = pytest.mark.django_db
 PRODUCT_DETAIL_URL = "product:product-detail"
 PRODUCT_LIST_URL = "product:product-list"
 STOCK_REPORT_URL = "product:product-generate-low-stock-report"
+LOW_STOCK_URL = "product:product-low-stock"
+LOW_STOCK_BUCKETS_URL = "product:product-low-stock-buckets"
+CACHE_STATS_URL = "product:product-product-cache-stats"
+STOCK_AT_URL = "product:product-product-stock-at"
+BULK_UPSERT_URL = "product:product-bulk-upsert"
 
 
 class TestProductEndpoints:
@@ -153,3 +174,392 @@ class TestProductEndpoints:
         assert response.status_code == status_code
         if response.status_code == 200:
            assert response.json().get("total") == 3
+
+    def test_needs_reorder_is_maintained(self, api_client, mocked_authentication_with_role):
+        """the flag follows stock changes and edits of the quantity or reorder point"""
+        user = UserFactory()
+        mocked_authentication_with_role(active_user=user, role='admin')
+        payload = {"name": "ProductA", "description": "description", "quantity": 8, "price": "2.00", "reorder_point": 5}
+        product_id = api_client.post(reverse(PRODUCT_LIST_URL), data=payload, format="json").data["id"]
+        assert not Product.objects.get(pk=product_id).needs_reorder
+
+        Product.objects.reserve_stock({product_id: 3})
+        assert Product.objects.get(pk=product_id).needs_reorder
+        Product.objects.release_stock({product_id: 1})
+        assert not Product.objects.get(pk=product_id).needs_reorder
+
+        api_client.patch(reverse(PRODUCT_DETAIL_URL, kwargs={"pk": product_id}), data={**payload, "quantity": 6, "reorder_point": 6}, format="json")
+        assert Product.objects.get(pk=product_id).needs_reorder
+
+    def test_low_stock_keyset_pages(self, api_client, mocked_authentication_with_role):
+        """products at or below their reorder point, least stock first, walked with cursors"""
+        user = UserFactory()
+        mocked_authentication_with_role(active_user=user, role='admin')
+        for quantity in (7, 0, 3, 3, 12, 10):
+            ProductFactory(quantity=quantity, created_by=user)
+        ProductFactory(quantity=12, reorder_point=20, created_by=user)
+
+        url = reverse(LOW_STOCK_URL) + "?page_size=2"
+        pages = []
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == 200
+            assert "created_by" not in response.data["results"][0]
+            pages.append(response.data)
+            url = response.data["links"]["next"]
+        quantities = [row["quantity"] for page in pages for row in page["results"]]
+        assert quantities == [0, 3, 3, 7, 10, 12]
+        previous = api_client.get(pages[-1]["links"]["previous"]).data
+        assert previous["results"] == pages[-2]["results"]
+
+        response = api_client.get(reverse(LOW_STOCK_URL), {"quantity": 4})
+        assert [row["quantity"] for row in response.data["results"]] == [0, 3, 3]
+        assert api_client.get(reverse(LOW_STOCK_URL), {"cursor": "x"}).status_code == 404
+
+    def test_low_stock_buckets(self, api_client, mocked_authentication_with_role, django_assert_num_queries):
+        user = UserFactory()
+        mocked_authentication_with_role(active_user=user, role='admin')
+        for quantity in (0, 3, 3, 9, 40):
+            ProductFactory(quantity=quantity, created_by=user)
+
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse(LOW_STOCK_BUCKETS_URL), {"thresholds": "1,5,10"})
+
+        assert response.data == {
+            "buckets": [
+                {"min": 0, "max": 1, "count": 1},
+                {"min": 1, "max": 5, "count": 2},
+                {"min": 5, "max": 10, "count": 1},
+                {"min": 10, "max": None, "count": 1},
+            ],
+            "needs_reorder": 4,
+        }
+        assert api_client.get(reverse(LOW_STOCK_BUCKETS_URL), {"thresholds": "5,1"}).status_code == 400
+
+    def test_stock_ledger_answers_point_in_time_queries(self, api_client, mocked_authentication_with_role):
+        """movements from product edits and stock changes, before and after compaction"""
+        user = UserFactory()
+        mocked_authentication_with_role(active_user=user, role='admin')
+        product = ProductFactory(quantity=10, created_by=user)
+        Product.objects.reserve_stock({product.id: 4})
+        product.refresh_from_db()
+        product.quantity = 20
+        product.save()
+        Product.objects.release_stock({product.id: 2})
+
+        movements = list(StockMovement.objects.filter(product=product).order_by("id"))
+        assert [(movement.delta, movement.reason) for movement in movements] == [
+            (10, "created"), (-4, "order_placed"), (14, "adjusted"), (2, "order_cancelled")
+        ]
+        times = [movement.created_at for movement in movements]
+        expected = [10, 6, 20, 22]
+        assert [stock_at(product.id, at) for at in times] == expected
+
+        assert compact_ledger(times[1]) == (1, 2)
+        assert StockSnapshot.objects.get(product=product).quantity == 6
+        assert [stock_at(product.id, at) for at in times[1:]] == expected[1:]
+        assert compact_ledger(times[-1]) == (1, 2)
+        assert StockMovement.objects.filter(product=product).count() == 0
+        # compacted history is kept at the snapshot times
+        assert (stock_at(product.id, times[1]), stock_at(product.id, times[-1])) == (6, 22)
+
+        url = reverse(STOCK_AT_URL, kwargs={"pk": product.id})
+        assert api_client.get(url, {"at": times[-1].isoformat()}).data["quantity"] == 22
+        assert api_client.get(url, {"at": "yesterday"}).status_code == 400
+
+    def test_compact_stock_ledger_command(self):
+        product = ProductFactory(quantity=5, created_by=UserFactory())
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=40))
+        Product.objects.release_stock({product.id: 1})
+        out = StringIO()
+
+        call_command("compact_stock_ledger", "--older-than-days", "30", stdout=out)
+
+        assert "Folded 1 stock movements into 1 snapshots" in out.getvalue()
+        assert stock_at(product.id, timezone.now()) == 6
+
+    def test_bulk_upsert_products(self, api_client, mocked_authentication_with_role):
+        """records create or update products by sku, invalid ones are reported without failing the rest"""
+        user = UserFactory()
+        mocked_authentication_with_role(active_user=user, role='admin')
+        existing = ProductFactory(sku="SKU-1", name="old", quantity=20, reorder_point=5, created_by=UserFactory())
+        payload = [
+            {"sku": "SKU-1", "quantity": 3, "price": "4.50"},
+            {"sku": "SKU-2", "name": "new", "quantity": 40, "price": 1},
+            {"sku": "SKU-3", "quantity": 0, "price": 1},
+            {"name": "no sku", "quantity": 1, "price": 1},
+            "not a product",
+        ]
+
+        response = api_client.post(reverse(BULK_UPSERT_URL) + "?batch_size=2", payload, format="json")
+
+        assert response.status_code == 200
+        assert (response.data["created"], response.data["updated"], response.data["failed"]) == (1, 1, 3)
+        assert response.data["results"][0] == {"index": 0, "success": True, "product": existing.id, "created": False}
+        assert [result["success"] for result in response.data["results"]] == [True, True, False, False, False]
+        assert "sku" in response.data["results"][3]["errors"]
+        existing.refresh_from_db()
+        # fields left out keep their value
+        assert (existing.name, existing.quantity, existing.price, existing.needs_reorder) == ("old", 3, Decimal("4.50"), True)
+        created = Product.objects.get(sku="SKU-2")
+        assert created.created_by == user and not created.needs_reorder
+        assert stock_at(existing.id, timezone.now()) == 3
+        assert stock_at(created.id, timezone.now()) == 40
+
+        csv_body = "sku,name,description,quantity,price,reorder_point\nSKU-2,renamed,,41,1.00,\n"
+        response = api_client.post(reverse(BULK_UPSERT_URL), csv_body, content_type="text/csv")
+        assert (response.data["created"], response.data["updated"]) == (0, 1)
+        assert Product.objects.values_list("name", "quantity").get(sku="SKU-2") == ("renamed", 41)
+        assert api_client.post(reverse(BULK_UPSERT_URL), {"sku": "SKU-4"}, format="json").status_code == 400
+
+    def test_bulk_upsert_duplicate_sku_in_one_batch(self, api_client, mocked_authentication_with_role):
+        """a new sku listed twice is created once, by its last record, the earlier one is superseded"""
+        mocked_authentication_with_role(active_user=UserFactory(), role='admin')
+        payload = [
+            {"sku": "SKU-1", "quantity": 3, "price": 1},
+            {"sku": "SKU-2", "quantity": 1, "price": 1},
+            {"sku": "SKU-1", "quantity": 7, "price": 2},
+        ]
+
+        response = api_client.post(reverse(BULK_UPSERT_URL), payload, format="json")
+
+        assert response.status_code == 200
+        assert (response.data["created"], response.data["updated"], response.data["failed"]) == (2, 1, 0)
+        product = Product.objects.get(sku="SKU-1")
+        assert response.data["results"][0] == {
+            "index": 0, "success": True, "product": product.id, "created": False, "superseded": True
+        }
+        assert response.data["results"][2] == {"index": 2, "success": True, "product": product.id, "created": True}
+        assert list(StockMovement.objects.filter(product=product).values_list("reason", "delta")) == [("created", 7)]
+        assert (product.quantity, product.price) == (7, Decimal("2.00"))
+
+    def test_import_products_command(self, tmp_path):
+        """a CSV is validated and upserted batch by batch, invalid rows are reported on stderr"""
+        user = UserFactory()
+        ProductFactory(sku="SKU-0", quantity=1, created_by=user)
+        rows = [f"SKU-{index},product {index},,{index + 1},{index}.25,10" for index in range(2500)]
+        path = tmp_path / "products.csv"
+        path.write_text("sku,name,description,quantity,price,reorder_point\n" + "\n".join(rows) + "\nSKU-X,,,-1,1,\n")
+        out, err = StringIO(), StringIO()
+
+        call_command(
+            "import_products", str(path), "--created-by", str(user.id), "--batch-size", "1000", stdout=out, stderr=err
+        )
+
+        assert "Imported 2500 products (2499 created), 1 failed" in out.getvalue()
+        assert "record 2500" in err.getvalue()
+        assert Product.objects.filter(needs_reorder=True).count() == 10
+        assert stock_at(Product.objects.get(sku="SKU-2499").id, timezone.now()) == 2500
+
+    def test_list_product_with_cursor_pagination(self, mocked_authentication, api_client):
+        """Test walking the product list with keyset cursors"""
+        user = UserFactory()
+        auth_user = mocked_authentication(active_user=user)
+        products = ProductFactory.create_batch(5, created_by=auth_user)
+        # ties on created_at are broken by id
+        Product.objects.filter(id__in=[products[1].id, products[2].id]).update(created_at=products[1].created_at)
+        url = reverse(PRODUCT_LIST_URL) + "?pagination=cursor&page_size=2"
+
+        seen = []
+        pages = []
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == 200
+            assert "total" not in response.json()
+            pages.append(response.json())
+            seen.extend(product["id"] for product in response.json()["results"])
+            url = response.json()["links"]["next"]
+
+        expected = list(Product.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        assert seen == expected
+        assert pages[0]["links"]["previous"] is None
+        previous = api_client.get(pages[1]["links"]["previous"]).json()
+        assert [product["id"] for product in previous["results"]] == expected[:2]
+
+    def test_list_product_with_cursor_pagination_count(self, mocked_authentication, api_client):
+        user = UserFactory()
+        auth_user = mocked_authentication(active_user=user)
+        ProductFactory.create_batch(3, created_by=auth_user)
+        url = reverse(PRODUCT_LIST_URL) + "?pagination=cursor&with_count=true"
+        response = api_client.get(url)
+        assert response.json()["total"] == 3
+        assert api_client.get(reverse(PRODUCT_LIST_URL) + "?pagination=cursor&cursor=bogus").status_code == 404
+
+    def test_list_product_with_cursor_pagination_skips_count(self, mocked_authentication, api_client):
+        """keyset pages build their ETag without counting the rows, unless the total is asked for"""
+        user = UserFactory()
+        auth_user = mocked_authentication(active_user=user)
+        product = ProductFactory.create_batch(3, created_by=auth_user)[0]
+        url = reverse(PRODUCT_LIST_URL) + "?pagination=cursor&page_size=2"
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url)
+        assert response.status_code == 200
+        assert not [query for query in context.captured_queries if "COUNT(" in query["sql"].upper()]
+
+        product.name = "renamed"
+        product.save()
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 200
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url + "&with_count=true")
+        assert response.json()["total"] == 3
+        assert len([query for query in context.captured_queries if "COUNT(" in query["sql"].upper()]) == 1
+
+    def test_list_product_count_strategies(self, mocked_authentication, api_client):
+        """the product list counts exactly, opt-in estimates never cut the pages short"""
+        user = UserFactory()
+        auth_user = mocked_authentication(active_user=user)
+        ProductFactory.create_batch(5, created_by=auth_user, name="chair")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        ProductFactory.create_batch(40, created_by=auth_user, name="chair")
+
+        url = reverse(PRODUCT_LIST_URL)
+        response = api_client.get(url, {"page_size": 20}).json()
+        assert (response["total"], response["total_pages"]) == (45, 3)
+        assert api_client.get(url + "?search=chair").json()["total"] == 45
+
+        products = Product.objects.order_by("id")
+        assert get_count(products.all(), "estimated") == 5
+        page = CountStrategyPaginator(products, 20, count_strategy="estimated").page(1)
+        assert page.has_next() and page.paginator.count == 21
+        page = CountStrategyPaginator(products, 20, count_strategy="estimated").page(3)
+        assert len(page) == 5 and not page.has_next() and page.paginator.count == 45
+        with pytest.raises(EmptyPage):
+            CountStrategyPaginator(products, 20, count_strategy="estimated").page(4)
+
+    def test_fulltext_search_products(self, mocked_authentication, api_client):
+        """Test ranked, prefix matching full-text search kept in sync with product writes"""
+        user = UserFactory()
+        auth_user = mocked_authentication(active_user=user)
+        lamp = ProductFactory(created_by=auth_user, name="desk lamp", description="a small lamp")
+        ProductFactory(created_by=auth_user, name="floor lamp", description="tall")
+        chair = ProductFactory(created_by=auth_user, name="chair", description="wooden")
+        url = reverse(PRODUCT_LIST_URL) + "?search_mode=fulltext&search="
+
+        results = api_client.get(url + "lam").json()["results"]
+        assert [product["name"] for product in results] == ["desk lamp", "floor lamp"]
+
+        chair.name = "lamp stand"
+        chair.save()
+        lamp.delete()
+        results = api_client.get(url + "lamp").json()["results"]
+        assert sorted(product["name"] for product in results) == ["floor lamp", "lamp stand"]
+        assert api_client.get(url + "wood lamp").json()["total"] == 1
+        assert api_client.get(url + "sofa").json()["total"] == 0
+
+    def test_get_product_is_served_from_cache(self, mocked_authentication_with_role, api_client, django_assert_num_queries):
+        """Test product detail reads skip the database once cached and see writes"""
+        user = UserFactory()
+        auth_user = mocked_authentication_with_role(active_user=user, role='admin')
+        product = ProductFactory.create(created_by=auth_user, quantity=5)
+        url = reverse(PRODUCT_DETAIL_URL, kwargs={"pk": product.id})
+
+        assert api_client.get(url).data["quantity"] == 5
+        with django_assert_num_queries(0):
+            assert api_client.get(url).data["quantity"] == 5
+
+        Product.objects.reserve_stock({product.id: 2})
+        assert api_client.get(url).data["quantity"] == 3
+        api_client.patch(url, data={"name": "renamed", "quantity": 3, "price": 1.5})
+        assert api_client.get(url).data["name"] == "renamed"
+        api_client.delete(url)
+        assert api_client.get(url).status_code == 404
+
+        stats = api_client.get(reverse(CACHE_STATS_URL)).json()
+        assert stats == {"hits": 1, "misses": 4}
+
+    def test_product_saves_outside_the_api_drop_cached_prices(self):
+        """admin and shell edits go through Product.save, the cached price follows them"""
+        product = ProductFactory.create(created_by=UserFactory(), price=Decimal("2.00"), quantity=5)
+        assert get_price_quantities([product.id]) == {product.id: (Decimal("2.00"), 5)}
+
+        product.price = Decimal("3.50")
+        product.save()
+        assert get_price_quantities([product.id]) == {product.id: (Decimal("3.50"), 5)}
+        product_id = product.id
+        product.delete()
+        assert get_price_quantities([product_id]) == {}
+
+    def test_cached_products_are_dropped_again_on_commit(self, django_capture_on_commit_callbacks):
+        """entries cached by a read inside the writing transaction do not outlive its commit"""
+        product = ProductFactory.create(created_by=UserFactory(), price=Decimal("2.00"), quantity=5)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                Product.objects.reserve_stock({product.id: 2})
+                get_price_quantities([product.id])
+                assert product_cache().get(f"product:stock:{product.id}") is not None
+        assert product_cache().get(f"product:stock:{product.id}") is None
+
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                upsert_products([{"sku": "SKU-1", "quantity": 4, "price": "1.00"}], product.created_by)
+                product_id = Product.objects.get(sku="SKU-1").id
+                get_price_quantities([product_id])
+        assert product_cache().get(f"product:stock:{product_id}") is None
+
+    def test_conditional_get_products(self, mocked_authentication_with_role, api_client):
+        """Test unchanged product lists and details answer 304 to their validators"""
+        user = UserFactory()
+        auth_user = mocked_authentication_with_role(active_user=user, role='admin')
+        product = ProductFactory.create(created_by=auth_user)
+        list_url = reverse(PRODUCT_LIST_URL)
+        detail_url = reverse(PRODUCT_DETAIL_URL, kwargs={"pk": product.id})
+
+        list_etag = api_client.get(list_url)["ETag"]
+        response = api_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        assert response.status_code == 304
+        assert not response.content
+
+        detail = api_client.get(detail_url)
+        assert api_client.get(detail_url, HTTP_IF_NONE_MATCH=detail["ETag"]).status_code == 304
+        assert api_client.get(detail_url, HTTP_IF_MODIFIED_SINCE=detail["Last-Modified"]).status_code == 304
+
+        api_client.patch(detail_url, data={"name": "renamed", "quantity": 3, "price": 1.5})
+        assert api_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == 200
+        assert api_client.get(detail_url, HTTP_IF_NONE_MATCH=detail["ETag"]).status_code == 200
+        ProductFactory.create(created_by=auth_user)
+        assert api_client.get(list_url + "?page_size=5", HTTP_IF_NONE_MATCH=list_etag).status_code == 200
+
+    def test_product_values_path_matches_serializer(self, mocked_authentication_with_role, api_client):
+        """Test list and detail built from values() rows render the same JSON as the serializer"""
+        user = UserFactory(firstname=None)
+        auth_user = mocked_authentication_with_role(active_user=user, role='admin')
+        ProductFactory.create(created_by=auth_user, price=Decimal("12345678.5"), description=None)
+        product = ProductFactory.create(created_by=auth_user, name=None, price=Decimal("0.005"))
+        products = Product.objects.select_related("created_by").order_by("-created_at", "-id")
+
+        response = api_client.get(reverse(PRODUCT_LIST_URL))
+        assert JSONRenderer().render(response.data["results"]) == JSONRenderer().render(
+            ListProductSerializer(products, many=True).data
+        )
+        response = api_client.get(reverse(PRODUCT_LIST_URL) + "?pagination=cursor&page_size=1")
+        assert response.data["links"]["next"]
+
+        response = api_client.get(reverse(PRODUCT_DETAIL_URL, kwargs={"pk": product.id}))
+        assert JSONRenderer().render(response.data) == JSONRenderer().render(ListProductSerializer(product).data)
+
+    def test_list_products_with_sparse_fields(self, mocked_authentication_with_role, api_client):
+        """Test ?fields= trims the payload and the query, and applies to the cached detail"""
+        user = UserFactory()
+        auth_user = mocked_authentication_with_role(active_user=user, role='admin')
+        product = ProductFactory.create(created_by=auth_user, name="chair")
+        url = reverse(PRODUCT_LIST_URL)
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url, {"fields": "id,name,price,quantity"})
+        assert response.json()["results"] == [{"id": product.id, "name": "chair", "price": "2.30", "quantity": 4}]
+        page_query = context.captured_queries[-1]["sql"]
+        assert "user_user" not in page_query and "description" not in page_query
+
+        response = api_client.get(url, {"exclude": "created_by,description", "pagination": "cursor"})
+        assert "created_by" not in response.json()["results"][0]
+        assert "updated_at" in response.json()["results"][0]
+
+        detail_url = reverse(PRODUCT_DETAIL_URL, kwargs={"pk": product.id})
+        assert api_client.get(detail_url, {"fields": "name"}).json() == {"name": "chair"}
+        assert "created_by" in api_client.get(detail_url).json()
+        assert api_client.get(url, {"fields": "name,colour"}).status_code == 400
+
@@ -1,19 +1,44 @@
 from rest_framework import viewsets,filters,status
 from .models import Product
-from .serializers import ListProductSerializer,CreateProductSerializer
+from .serializers import ListProductSerializer,CreateProductSerializer,LowStockProductSerializer,ProductValuesSerializer
+from .search import ProductSearchFilter
+from .cache import cache_stats, get_product_payload
+from .imports import IMPORT_BATCH_SIZE, upsert_products
+from .ledger import stock_at
 from user.permissions import IsAdmin,IsRegularUser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from core.pagination import CustomPagination
+from core.parsers import CSVParser, FastJSONParser, NDJSONParser
+from core.conditional import ConditionalGetMixin, make_etag
+from core.pagination import CursorPaginationMixin, KeysetPagination
+from core.sparse import SparseFieldsMixin, parse_field_list
+from core.values import ValuesReadMixin
+from django.db.models import Count, Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
-class ProductViewSets(viewsets.ModelViewSet):
+LOW_STOCK_BUCKETS = (1, 5, 10, 25, 50)
+
+
+class LowStockPagination(KeysetPagination):
+    """keyset pagination on (quantity, id), least stock first"""
+
+    cursor_fields = ("quantity", "id")
+    descending = False
+    cursor_parsers = {"quantity": int, "id": int}
+
+
+class ProductViewSets(SparseFieldsMixin, ValuesReadMixin, ConditionalGetMixin, CursorPaginationMixin, viewsets.ModelViewSet):
     queryset = Product.objects.select_related("created_by").all()
     http_method_names = ["get","post","patch","put","delete"]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    count_strategy = "cached"
+    values_serializer_classes = (ProductValuesSerializer,)
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     search_fields = [
         'name',
         'description',
@@ -25,10 +50,24 @@ class ProductViewSets(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not str(pk).isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        # the cache holds every field, ?fields= and ?exclude= are applied on the way out
+        payload = get_product_payload(int(pk), lambda: self.get_object_data(all_fields=True))
+        # validators come from the cached payload so hot products never touch the database
+        updated_at = payload.get("updated_at")
+        etag = make_etag("detail", self.etag_scope(), updated_at)
+        last_modified = parse_datetime(updated_at) if updated_at else None
+        return self.conditional_response(etag, last_modified, lambda: Response(self.select_fields(payload)))
+
     def get_serializer_class(self):
         if self.action in ["list","retrieve"]:
             return ListProductSerializer
-        elif self.action == 'generate_low_stock_report':
+        elif self.action in [
+            'generate_low_stock_report', 'low_stock', 'low_stock_buckets', 'product_stock_at', 'product_cache_stats'
+        ]:
             return None
         else:
             return  CreateProductSerializer
@@ -79,3 +118,176 @@ class ProductViewSets(viewsets.ModelViewSet):
             return Response(data={"error":"quantity must be greater than zero"}, status=status.HTTP_400_BAD_REQUEST)
         products = Product.objects.filter(quantity__lt=quantity).select_related("created_by").all()
         return self.paginate_results(products,ListProductSerializer)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="quantity",
+                description="products with less than this quantity instead of those at or below their reorder point",
+                required=False,
+                type=OpenApiTypes.INT,
+            ),
+            OpenApiParameter(name="cursor", required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name="page_size", required=False, type=OpenApiTypes.INT),
+            OpenApiParameter(name="with_count", required=False, type=OpenApiTypes.BOOL),
+        ],
+        responses=LowStockProductSerializer(many=True),
+    )
+    @action(
+        methods=['GET'],
+        detail=False,
+        serializer_class=None,
+        permission_classes=[IsAdmin],
+        url_path='low-stock',
+    )
+    def low_stock(self, request, pk=None):
+        """products at or below their reorder point, least stock first, read from the needs_reorder index"""
+        quantity = request.query_params.get("quantity")
+        if quantity is None:
+            products = Product.objects.filter(needs_reorder=True)
+        else:
+            try:
+                quantity = int(quantity)
+            except ValueError:
+                quantity = 0
+            if quantity <= 0:
+                return Response(data={"error": "quantity must be greater than zero"}, status=status.HTTP_400_BAD_REQUEST)
+            products = Product.objects.filter(quantity__lt=quantity)
+
+        paginator = LowStockPagination()
+        page = paginator.paginate_queryset(products.only(*LowStockProductSerializer.Meta.fields), request, view=self)
+        return paginator.get_paginated_response(LowStockProductSerializer(page, many=True).data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="thresholds",
+                description=f"ascending bucket bounds, e.g {','.join(map(str, LOW_STOCK_BUCKETS))} (the default)",
+                required=False,
+                type=OpenApiTypes.STR,
+            ),
+        ],
+    )
+    @action(
+        methods=['GET'],
+        detail=False,
+        serializer_class=None,
+        permission_classes=[IsAdmin],
+        url_path='low-stock-buckets',
+    )
+    def low_stock_buckets(self, request, pk=None):
+        """number of products per quantity bucket and at or below their reorder point, in one query"""
+        try:
+            thresholds = [int(value) for value in parse_field_list(request.query_params.get("thresholds"))]
+        except ValueError:
+            thresholds = [0]
+        thresholds = thresholds or list(LOW_STOCK_BUCKETS)
+        if thresholds[0] <= 0 or thresholds != sorted(set(thresholds)):
+            return Response(
+                data={"error": "thresholds must be ascending numbers greater than zero"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        bounds = list(zip([0, *thresholds], [*thresholds, None]))
+        counts = Product.objects.aggregate(
+            needs_reorder=Count("id", filter=Q(needs_reorder=True)),
+            **{
+                f"bucket_{index}": Count("id", filter=Q(quantity__gte=low, **({} if high is None else {"quantity__lt": high})))
+                for index, (low, high) in enumerate(bounds)
+            },
+        )
+        response = {
+            "buckets": [
+                {"min": low, "max": high, "count": counts[f"bucket_{index}"]}
+                for index, (low, high) in enumerate(bounds)
+            ],
+            "needs_reorder": counts["needs_reorder"],
+        }
+        return Response(data=response, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="at",
+                description="point in time as an ISO 8601 datetime, e.g 2024-05-01T12:00:00Z",
+                required=True,
+                type=OpenApiTypes.DATETIME,
+            ),
+        ],
+    )
+    @action(
+        methods=['GET'],
+        detail=True,
+        serializer_class=None,
+        permission_classes=[IsAdmin],
+        url_path='stock-at',
+    )
+    def product_stock_at(self, request, pk=None):
+        """the stock of the product at a point in time, from the stock ledger"""
+        at = parse_datetime(request.query_params.get("at", ""))
+        if at is None:
+            return Response(
+                data={"error": "at is required as an ISO 8601 datetime"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        product = get_object_or_404(Product.objects.only("id"), pk=pk)
+        response = {"product": product.pk, "at": at, "quantity": stock_at(product.pk, at)}
+        return Response(data=response, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="batch_size",
+                description=f"products written per transaction, defaults to {IMPORT_BATCH_SIZE}",
+                required=False,
+                type=OpenApiTypes.INT,
+            ),
+        ],
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        serializer_class=None,
+        permission_classes=[IsAdmin],
+        parser_classes=[FastJSONParser, NDJSONParser, CSVParser],
+        url_path='bulk-upsert',
+    )
+    def bulk_upsert(self, request, pk=None):
+        """create or update many products by sku from a JSON array, an NDJSON stream or a CSV file, reporting the result of every record"""
+        if not isinstance(request.data, list):
+            return Response(
+                data={"error": "Expected a list of products"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            batch_size = int(request.query_params.get("batch_size", IMPORT_BATCH_SIZE))
+        except ValueError:
+            batch_size = 0
+        if batch_size <= 0:
+            return Response(
+                data={"error": "batch_size must be a positive number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = upsert_products(request.data, request.user, batch_size)
+        created = sum(1 for result in results if result["success"] and result["created"])
+        updated = sum(1 for result in results if result["success"] and not result["created"])
+        response = {
+            "created": created,
+            "updated": updated,
+            "failed": len(results) - created - updated,
+            "results": results,
+        }
+        return Response(data=response, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        serializer_class=None,
+        permission_classes=[IsAdmin],
+        url_path='cache-stats',
+    )
+    def product_cache_stats(self, request, pk=None):
+        """hit and miss counters of the product cache"""
+        return Response(data=cache_stats(), status=status.HTTP_200_OK)
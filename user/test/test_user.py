@@ -6,6 +6,8 @@ from .factories import UserFactory
 pytestmark = pytest.mark.django_db
 LOGIN_URL = "user:user-login"
 REGISTER_URL = "user:user-register-user"
+USER_LIST_URL = "user:user-list"
+USER_DETAIL_URL = "user:user-detail"
 
 
 class TestUserEndpoints:
@@ -68,3 +70,20 @@ class TestUserEndpoints:
         url = reverse("user:user-login")
         response = api_client.post(url, data=payload)
         assert response.status_code == 401
+
+    def test_list_users_with_sparse_fields(self, api_client, mocked_authentication):
+        """test ?fields= and ?exclude= trim the user payload"""
+        user = UserFactory()
+        mocked_authentication(active_user=user)
+        url = reverse(USER_LIST_URL)
+
+        response = api_client.get(url, {"fields": "id,email"})
+        assert response.status_code == 200
+        assert [list(result) for result in response.json()["results"]] == [["id", "email"]]
+
+        response = api_client.get(reverse(USER_DETAIL_URL, kwargs={"pk": user.id}), {"exclude": "password"})
+        assert "password" not in response.json()
+        assert response.json()["email"] == user.email
+
+        assert api_client.get(url, {"fields": "id,token"}).status_code == 400
+
@@ -9,12 +9,14 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import get_user_model
 from rest_framework.decorators import action
 from .tokens import create_jwt_pair_for_user
+from core.sparse import SparseFieldsMixin
 
 
 User = get_user_model()
 
 
 class UserViewSets(
+    SparseFieldsMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,